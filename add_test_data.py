@@ -10,6 +10,7 @@ Usage:
 import sqlite3
 from datetime import datetime, timedelta
 import random
+from database import init_db, to_day, rebuild_customer_balances, rebuild_daily_summary, rebuild_alerts
 
 DATABASE_NAME = "Vyapar_Digikhata.db"
 
@@ -27,7 +28,7 @@ def clear_all_data():
     print("=" * 60)
     conn = get_conn()
     cursor = conn.cursor()
-    tables = ["payment_reminders", "transactions", "inventory", "suppliers", "customers", "users"]
+    tables = ["outbox", "reminder_monthly_summary", "payment_reminders_archive", "payment_reminders", "customer_balances", "daily_summary", "alerts", "alert_settings", "transactions", "inventory", "suppliers", "customers", "users"]
     for table in tables:
         try:
             cursor.execute(f"DELETE FROM {table}")
@@ -222,13 +223,16 @@ def add_transactions(users, customer_ids):
                         if ttype == 'Credit'
                         else f"Payment received - #{random.randint(1000, 9999)}")
                 cursor.execute(
-                    "INSERT INTO transactions(user_id, customer_id, type, amount, date, description) VALUES(?,?,?,?,?,?)",
-                    (u['id'], cid, ttype, amount, date, desc)
+                    "INSERT INTO transactions(user_id, customer_id, type, amount, date, date_day, description) VALUES(?,?,?,?,?,?,?)",
+                    (u['id'], cid, ttype, amount, date, to_day(date), desc)
                 )
                 count += 1
         print(f"  {u['name']}: {count} transactions added")
     conn.commit()
     conn.close()
+    rebuild_customer_balances()
+    rebuild_daily_summary()
+    rebuild_alerts()
 
 # ─────────────────────────────────────────────
 # STEP 5: Suppliers
@@ -280,6 +284,7 @@ def main():
     print("*" + "  VYAPAR DIGIKHATA - FRESH DATA SETUP  ".center(58) + "*")
     print("*" * 60)
 
+    init_db()
     clear_all_data()
     users        = add_users()
     customer_ids = add_customers(users)
@@ -1,7 +1,8 @@
 import streamlit as st
-from login import login_page 
-from sign_up import sign_up_page
-from dashboard import show_dashboard 
+from database import init_db
+
+# Page modules are imported by the router below, so the landing page never
+# loads the dashboard's dependencies (pandas, numpy)
 
 st.set_page_config(
     page_title="Vyapar : DigiKhata",
@@ -254,6 +255,9 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Apply pending schema migrations (only does work on the first run of the process)
+init_db()
+
 # Session State Initialization
 if 'page' not in st.session_state:
     st.session_state.page = "home"
@@ -611,12 +615,15 @@ if st.session_state.page == "home":
     home_page()
 
 elif st.session_state.page == "login":
+    from login import login_page
     login_page()
 
 elif st.session_state.page == "sign_up":
+    from sign_up import sign_up_page
     sign_up_page()
 
 elif st.session_state.page == "dashboard":
+    from dashboard import show_dashboard
     show_dashboard()
 
 # --- SCROLL POSITION FIX ---
@@ -2,45 +2,26 @@
 Automated Reminders Module
 Tracks and sends payment reminders automatically
 
-Creates a reminder schedule table and tracks sent reminders
+Sent reminders are logged in the payment_reminders table (see migrations.py)
+
+Usage:
+    python -m auto_reminders run --dispatcher print              # send today's reminders for every shop
+    python -m auto_reminders run --dispatcher print --workers 8  # spread shops over 8 worker threads
+    python -m auto_reminders run --dry-run                       # count candidates without logging or sending
+    python -m auto_reminders archive                             # move reminders past the retention window to the archive
+
+'run' needs a dispatcher: 'print' writes each reminder to stdout
 """
 
-import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import database as db
 
-DATABASE_NAME = "Vyapar_Digikhata.db"
-
-def init_reminders_table():
-    """Create reminders tracking table"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS payment_reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            customer_id INTEGER NOT NULL,
-            reminder_day INTEGER NOT NULL,
-            sent_date TEXT NOT NULL,
-            pending_amount REAL NOT NULL,
-            days_overdue INTEGER NOT NULL,
-            status TEXT DEFAULT 'sent',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (customer_id) REFERENCES customers(id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-# Initialize table
-init_reminders_table()
-
 def check_reminder_sent(user_id, customer_id, reminder_day):
     """Check if reminder already sent for this day threshold"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = db.get_connection()
     cursor = conn.cursor()
     
     # Check if reminder sent in last 24 hours for this threshold
@@ -49,62 +30,115 @@ def check_reminder_sent(user_id, customer_id, reminder_day):
     cursor.execute('''
         SELECT * FROM payment_reminders 
         WHERE user_id = ? AND customer_id = ? 
-        AND reminder_day = ? AND sent_date >= ?
+        AND reminder_day = ? AND sent_date >= ? AND status != 'failed'
     ''', (user_id, customer_id, reminder_day, yesterday))
     
     result = cursor.fetchone()
-    conn.close()
     
     return result is not None
 
-def log_reminder(user_id, customer_id, reminder_day, pending_amount, days_overdue):
-    """Log sent reminder"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO payment_reminders 
-        (user_id, customer_id, reminder_day, sent_date, pending_amount, days_overdue)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (user_id, customer_id, reminder_day, datetime.now().strftime('%Y-%m-%d'), 
-          pending_amount, days_overdue))
-    
-    conn.commit()
-    conn.close()
-
-def get_customers_needing_reminders(user_id):
+def log_reminder(user_id, customer_id, reminder_day, pending_amount, days_overdue, cursor=None, sent_date=None):
     """
-    Get customers who need payment reminders
-    Returns list categorized by reminder day (10, 20, 30 days)
+    Log sent reminder
+    cursor: write inside the caller's transaction instead of committing on its own
+    Returns: id of the payment_reminders row
     """
-    from settings import get_overdue_customers
+    sent_date = sent_date or datetime.now().strftime('%Y-%m-%d')
+    
+    def write(cursor):
+        cursor.execute('''
+            INSERT INTO payment_reminders 
+            (user_id, customer_id, reminder_day, sent_date, pending_amount, days_overdue)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, customer_id, reminder_day, sent_date, 
+              pending_amount, days_overdue))
+        return cursor.lastrowid
     
-    overdue_customers = get_overdue_customers(user_id)
+    if cursor is None:
+        return db.run_write(write)
+    return write(cursor)
+
+# Reminder {day} already sent to customer o since :since (failed sends do not count)
+_REMINDER_SENT = """
+    EXISTS (
+        SELECT 1 FROM payment_reminders r
+        WHERE r.user_id = :user_id AND r.customer_id = o.customer_id
+        AND r.reminder_day = {day} AND r.sent_date >= :since AND r.status != 'failed'
+    )
+"""
+
+# Overdue customers (database.OVERDUE_CUSTOMERS_SQL), each with the most
+# urgent threshold (30, 20 or 10 days) they have reached and not been reminded
+# about since :since. Customers with nothing left to send get NULL and are dropped.
+# MATERIALIZED keeps SQLite from running the NOT EXISTS lookups twice (SELECT + WHERE).
+_REMINDER_CANDIDATES = f"""
+    WITH overdue AS ({db.OVERDUE_CUSTOMERS_SQL}),
+    candidates AS MATERIALIZED (
+        SELECT o.*,
+            CASE
+                WHEN o.days_overdue >= 30 AND NOT {_REMINDER_SENT.format(day=30)} THEN 30
+                WHEN o.days_overdue >= 20 AND NOT {_REMINDER_SENT.format(day=20)} THEN 20
+                WHEN o.days_overdue >= 10 AND NOT {_REMINDER_SENT.format(day=10)} THEN 10
+            END as reminder_day
+        FROM overdue o
+    )
+    SELECT * FROM candidates
+    WHERE reminder_day IS NOT NULL
+    ORDER BY days_overdue DESC, customer_id
+"""
+
+def _fetch_reminder_candidates(cursor, user_id, today):
+    # Same window as check_reminder_sent: anything sent since yesterday counts
+    since = db.from_day(today - 1).strftime('%Y-%m-%d')
+    cursor.execute(_REMINDER_CANDIDATES, {'user_id': user_id, 'today': today, 'since': since, 'min_days': None})
     
     reminders_needed = {
         10: [],  # 10 days overdue
         20: [],  # 20 days overdue
         30: []   # 30+ days overdue
     }
-    
-    for customer in overdue_customers:
-        days = customer['days_overdue']
-        customer_id = customer['customer_id']
-        
-        # Determine which reminder threshold
-        if days >= 30 and not check_reminder_sent(user_id, customer_id, 30):
-            reminders_needed[30].append(customer)
-        elif days >= 20 and not check_reminder_sent(user_id, customer_id, 20):
-            reminders_needed[20].append(customer)
-        elif days >= 10 and not check_reminder_sent(user_id, customer_id, 10):
-            reminders_needed[10].append(customer)
+    for row in cursor.fetchall():
+        customer = dict(row)
+        reminder_day = customer.pop('reminder_day')
+        customer['last_transaction_date'] = db.from_day(customer.pop('last_txn_day')).strftime('%Y-%m-%d')
+        reminders_needed[reminder_day].append(customer)
     
     return reminders_needed
 
+def get_customers_needing_reminders(user_id, today=None):
+    """
+    Get customers who need payment reminders - one query, however many are overdue
+    Returns list categorized by reminder day (10, 20, 30 days)
+    """
+    today = db.today_day() if today is None else today
+    conn = db.get_connection()
+    return _fetch_reminder_candidates(conn.cursor(), user_id, today)
+
+def claim_reminders(user_id, today=None):
+    """
+    Pick a shop's reminder candidates and log them in one write transaction.
+    The write lock is held from the pick to the log, so a second scheduler
+    running at the same time waits and then finds them already sent.
+    Returns: list of (reminder_id, reminder_day, customer)
+    """
+    today = db.today_day() if today is None else today
+    sent_date = db.from_day(today).strftime('%Y-%m-%d')
+    
+    def write(cursor):
+        claimed = []
+        for reminder_day, customers in _fetch_reminder_candidates(cursor, user_id, today).items():
+            for customer in customers:
+                reminder_id = log_reminder(user_id, customer['customer_id'], reminder_day,
+                                           customer['pending_amount'], customer['days_overdue'],
+                                           cursor=cursor, sent_date=sent_date)
+                claimed.append((reminder_id, reminder_day, customer))
+        return claimed
+    
+    return db.run_write(write)
+
 def get_reminder_history(user_id, customer_id=None):
-    """Get reminder history for user or specific customer"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
+    """Get reminder history for user or specific customer (older than REMINDER_RETENTION_DAYS: see the archive)"""
+    conn = db.get_connection()
     cursor = conn.cursor()
     
     if customer_id:
@@ -126,47 +160,99 @@ def get_reminder_history(user_id, customer_id=None):
         ''', (user_id,))
     
     reminders = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     return reminders
 
 def get_reminder_stats(user_id):
-    """Get reminder statistics for dashboard"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    """Get reminder statistics for dashboard - live rows and archived monthly totals in one grouped query"""
+    conn = db.get_connection()
     cursor = conn.cursor()
     
-    # Total reminders sent
-    cursor.execute('SELECT COUNT(*) FROM payment_reminders WHERE user_id = ?', (user_id,))
-    total_sent = cursor.fetchone()[0]
-    
-    # Reminders in last 30 days
     thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
     cursor.execute('''
-        SELECT COUNT(*) FROM payment_reminders 
-        WHERE user_id = ? AND sent_date >= ?
-    ''', (user_id, thirty_days_ago))
-    recent_sent = cursor.fetchone()[0]
-    
-    # By reminder day
-    cursor.execute('''
-        SELECT reminder_day, COUNT(*) as count 
-        FROM payment_reminders 
-        WHERE user_id = ?
+        SELECT reminder_day, SUM(sent) as sent, SUM(recent) as recent
+        FROM (
+            SELECT reminder_day, COUNT(*) as sent, SUM(sent_date >= ?) as recent
+            FROM payment_reminders
+            WHERE user_id = ? AND status != 'failed'
+            GROUP BY reminder_day
+            UNION ALL
+            SELECT reminder_day, sent_count, 0
+            FROM reminder_monthly_summary
+            WHERE user_id = ?
+        )
         GROUP BY reminder_day
-    ''', (user_id,))
-    
-    by_day = {row[0]: row[1] for row in cursor.fetchall()}
+    ''', (thirty_days_ago, user_id, user_id))
     
-    conn.close()
+    by_day = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
     
     return {
-        'total_sent': total_sent,
-        'recent_sent': recent_sent,
-        'day_10': by_day.get(10, 0),
-        'day_20': by_day.get(20, 0),
-        'day_30': by_day.get(30, 0)
+        'total_sent': sum(sent for sent, _ in by_day.values()),
+        'recent_sent': sum(recent for _, recent in by_day.values()),
+        'day_10': by_day.get(10, (0, 0))[0],
+        'day_20': by_day.get(20, (0, 0))[0],
+        'day_30': by_day.get(30, (0, 0))[0]
     }
 
+def get_reminder_monthly_summary(user_id):
+    """
+    Reminders sent per month and threshold, archived and live, newest month first
+    Returns: list of dicts with month ('YYYY-MM'), reminder_day, sent_count, total_pending
+    """
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT month, reminder_day, SUM(sent_count) as sent_count, SUM(total_pending) as total_pending
+        FROM (
+            SELECT month, reminder_day, sent_count, total_pending
+            FROM reminder_monthly_summary
+            WHERE user_id = ?
+            UNION ALL
+            SELECT substr(sent_date, 1, 7), reminder_day, COUNT(*), SUM(pending_amount)
+            FROM payment_reminders
+            WHERE user_id = ? AND status != 'failed'
+            GROUP BY 1, 2
+        )
+        GROUP BY month, reminder_day
+        ORDER BY month DESC, reminder_day
+    ''', (user_id, user_id))
+    return [dict(row) for row in cursor.fetchall()]
+
+# Reminders older than this move to payment_reminders_archive; must stay longer
+# than the dedupe window and the 30 days counted as 'recent' in get_reminder_stats
+REMINDER_RETENTION_DAYS = 90
+
+def archive_reminders(retention_days=REMINDER_RETENTION_DAYS, today=None):
+    """
+    Roll reminders older than retention_days into the monthly summary and the archive table
+    Returns: number of reminders archived
+    """
+    today = db.today_day() if today is None else today
+    cutoff = db.from_day(today - retention_days).strftime('%Y-%m-%d')
+    
+    def write(cursor):
+        cursor.execute('''
+            INSERT INTO reminder_monthly_summary(user_id, month, reminder_day, sent_count, total_pending)
+            SELECT user_id, substr(sent_date, 1, 7), reminder_day, COUNT(*), SUM(pending_amount)
+            FROM payment_reminders
+            WHERE sent_date < ? AND status != 'failed'
+            GROUP BY 1, 2, 3
+            ON CONFLICT(user_id, month, reminder_day) DO UPDATE SET
+                sent_count = sent_count + excluded.sent_count,
+                total_pending = total_pending + excluded.total_pending
+        ''', (cutoff,))
+        cursor.execute('''
+            INSERT INTO payment_reminders_archive
+                (id, user_id, customer_id, reminder_day, sent_date, pending_amount, days_overdue, status, created_at)
+            SELECT id, user_id, customer_id, reminder_day, sent_date, pending_amount, days_overdue, status, created_at
+            FROM payment_reminders
+            WHERE sent_date < ?
+        ''', (cutoff,))
+        cursor.execute("DELETE FROM payment_reminders WHERE sent_date < ?", (cutoff,))
+        return cursor.rowcount
+    
+    return db.run_write(write)
+
 def generate_reminder_message(customer_name, pending_amount, days_overdue, shop_name):
     """Generate appropriate reminder message based on days overdue"""
     
@@ -198,4 +284,128 @@ Best regards,
 
 _Automated reminder from Vyapar DigiKhata_"""
     
-    return message
\ No newline at end of file
+    return message
+
+# ─────────────────────────────────────────────
+# Scheduler
+# ─────────────────────────────────────────────
+def print_reminder(shop, customer, message):
+    """Dispatcher that writes the reminder to stdout (no customer messaging channel is wired up yet)"""
+    print(f"[{shop['shop_name']}] to {customer['customer_name']} ({customer['customer_phone'] or 'no contact'})")
+    print(message)
+    print()
+
+# Dispatchers selectable with 'run --dispatcher NAME'
+DISPATCHERS = {
+    'print': print_reminder,
+}
+
+def _mark_reminder_failed(reminder_id):
+    def write(cursor):
+        cursor.execute("UPDATE payment_reminders SET status = 'failed' WHERE id = ?", (reminder_id,))
+    db.run_write(write)
+
+def process_shop(shop, dispatch=print_reminder, today=None, dry_run=False):
+    """
+    Claim one shop's reminders and dispatch them
+    Returns: {'sent': {10: n, 20: n, 30: n}, 'failed': n, 'seconds': s}
+    """
+    start = time.perf_counter()
+    sent = {10: 0, 20: 0, 30: 0}
+    failed = 0
+    
+    if dry_run:
+        candidates = get_customers_needing_reminders(shop['id'], today)
+        claimed = [(None, day, customer) for day, customers in candidates.items() for customer in customers]
+    else:
+        claimed = claim_reminders(shop['id'], today)
+    
+    for reminder_id, reminder_day, customer in claimed:
+        message = generate_reminder_message(customer['customer_name'], customer['pending_amount'],
+                                            customer['days_overdue'], shop['shop_name'])
+        try:
+            if not dry_run:
+                dispatch(shop, customer, message)
+            sent[reminder_day] += 1
+        except Exception as e:
+            failed += 1
+            print(f"Reminder to customer {customer['customer_id']} of shop {shop['id']} failed: {e}", file=sys.stderr)
+            if reminder_id is not None:
+                _mark_reminder_failed(reminder_id)
+    
+    return {'sent': sent, 'failed': failed, 'seconds': time.perf_counter() - start}
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def run_reminders(workers=4, dispatch=print_reminder, today=None, dry_run=False):
+    """
+    Evaluate reminders for every shop, spread over a pool of worker threads
+    Returns: run stats (shops, sent per threshold, failed, errors, throughput and per-shop latency)
+    """
+    conn = db.get_connection()
+    shops = [dict(row) for row in conn.execute("SELECT id, shop_name FROM users ORDER BY id")]
+    
+    start = time.perf_counter()
+    results = []
+    errors = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_shop, shop, dispatch, today, dry_run): shop for shop in shops}
+        for future, shop in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"Reminders for shop {shop['id']} failed: {e}", file=sys.stderr)
+    seconds = time.perf_counter() - start
+    
+    sent = {day: sum(result['sent'][day] for result in results) for day in (10, 20, 30)}
+    latencies = sorted(result['seconds'] * 1000 for result in results) or [0.0]
+    total_sent = sum(sent.values())
+    return {
+        'shops': len(shops),
+        'sent': sent,
+        'failed': sum(result['failed'] for result in results),
+        'errors': errors,
+        'seconds': seconds,
+        'shops_per_second': len(shops) / seconds if seconds else 0.0,
+        'reminders_per_second': total_sent / seconds if seconds else 0.0,
+        'latency_ms': {'p50': _percentile(latencies, 0.5), 'p95': _percentile(latencies, 0.95), 'max': latencies[-1]},
+    }
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ("run", "archive"):
+        print(__doc__)
+        sys.exit(2)
+    
+    db.init_db()
+    if args[0] == "archive":
+        print(f"Archived {archive_reminders()} reminders older than {REMINDER_RETENTION_DAYS} days.")
+        return
+    
+    workers = 4
+    if "--workers" in args:
+        workers = int(args[args.index("--workers") + 1])
+    dry_run = "--dry-run" in args
+    dispatcher = args[args.index("--dispatcher") + 1] if "--dispatcher" in args else None
+    if not dry_run and dispatcher not in DISPATCHERS:
+        print(f"run needs --dry-run or --dispatcher {{{','.join(DISPATCHERS)}}}", file=sys.stderr)
+        sys.exit(2)
+    
+    stats = run_reminders(workers=workers, dispatch=DISPATCHERS.get(dispatcher), dry_run=dry_run)
+    
+    verb = "would send" if dry_run else "sent"
+    print(f"{stats['shops']} shops, {verb} {sum(stats['sent'].values())} reminders "
+          f"(10 days: {stats['sent'][10]}, 20 days: {stats['sent'][20]}, 30+ days: {stats['sent'][30]}), "
+          f"{stats['failed']} failed, {stats['errors']} shop errors")
+    print(f"{stats['seconds']:.2f} s, {stats['shops_per_second']:.1f} shops/s, "
+          f"{stats['reminders_per_second']:.1f} reminders/s, per shop p50 {stats['latency_ms']['p50']:.1f} ms, "
+          f"p95 {stats['latency_ms']['p95']:.1f} ms, max {stats['latency_ms']['max']:.1f} ms")
+    if not dry_run:
+        print(f"Archived {archive_reminders()} reminders older than {REMINDER_RETENTION_DAYS} days.")
+    if stats['failed'] or stats['errors']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
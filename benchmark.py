@@ -0,0 +1,923 @@
+"""
+Performance Benchmarks
+Seeds a scratch database in a temporary folder and times the database
+paths used by the dashboard. The real Vyapar_Digikhata.db is never touched,
+and the folder is deleted afterwards unless --keep is given.
+
+Usage:
+    python benchmark.py                # run every benchmark
+    python benchmark.py connections    # run a single benchmark (see BENCHMARKS)
+    python benchmark.py --keep scan    # keep the scratch folder to inspect the database
+"""
+
+import os
+import sys
+import random
+import shutil
+import socketserver
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import database as db
+
+# ─────────────────────────────────────────────
+# Helpers
+# ─────────────────────────────────────────────
+def header(title):
+    print("\n" + "=" * 60)
+    print(title)
+    print("=" * 60)
+
+def timed(fn, repeat=5):
+    """Run fn repeat times and return the median wall time in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def run_in_thread(fn):
+    """Run fn on a new thread, the way Streamlit runs each rerun"""
+    thread = threading.Thread(target=fn)
+    thread.start()
+    thread.join()
+
+def seed(customers=200, items=100, transactions=2000, email="bench@example.com"):
+    """Insert one shop with the given amount of data and return its user id"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users(owner_name, email, shop_name, password) VALUES(?,?,?,?)",
+                   ("Bench Owner", email, "Bench Store", "Bench@123"))
+    user_id = cursor.lastrowid
+
+    first_contact = 6000000000 + user_id * 1000000
+    cursor.executemany(
+        "INSERT INTO customers(user_id, name, contact, address) VALUES(?,?,?,?)",
+        [(user_id, f"Customer {i}", str(first_contact + i), "Bench Road") for i in range(customers)]
+    )
+    cursor.execute("SELECT id FROM customers WHERE user_id=?", (user_id,))
+    customer_ids = [row[0] for row in cursor.fetchall()]
+
+    cursor.executemany(
+        "INSERT INTO inventory(user_id, item_name, quantity, price_per_unit) VALUES(?,?,?,?)",
+        [(user_id, f"Item {i}", random.randint(0, 100), random.choice([20.0, 60.0, 250.0]))
+         for i in range(items)]
+    )
+
+    today = db.today_day()
+    rows = []
+    for _ in range(transactions):
+        day = today - random.randint(0, 365)
+        rows.append((user_id, random.choice(customer_ids), random.choice(['Credit', 'Credit', 'Debit']),
+                     random.choice([500, 1000, 2500]), db.from_day(day).strftime('%Y-%m-%d'), day,
+                     "Bench entry"))
+    cursor.executemany(
+        "INSERT INTO transactions(user_id, customer_id, type, amount, date, date_day, description) VALUES(?,?,?,?,?,?,?)",
+        rows
+    )
+    conn.commit()
+    db.rebuild_customer_balances(user_id)
+    db.rebuild_daily_summary(user_id)
+    return user_id
+
+# ─────────────────────────────────────────────
+# Connections per rerun
+# ─────────────────────────────────────────────
+def simulate_overview_rerun(user_id):
+    """The database calls made by one Home/Overview rerun of the dashboard"""
+    end = date.today()
+    start = end - timedelta(days=30)
+
+    # Notification badge
+    db.get_alert_count(user_id)
+
+    # Overview page
+    db.get_customers(user_id)
+    db.get_total_inventory_value(user_id)
+    db.get_period_totals(user_id, start, end)
+    db.get_daily_totals(user_id, start, end)
+    db.get_customer_profit_comparison(user_id)
+
+def bench_connections():
+    header("Connections per dashboard rerun")
+    user_id = seed()
+    reruns = 20
+    cache_entries = db.CACHE_MAX_ENTRIES
+    db.CACHE_MAX_ENTRIES = 0  # measure the queries, not the read cache
+
+    # Before: one fresh, unconfigured connection for every query
+    legacy_connects = 0
+    pooled_get_connection = db.get_connection
+
+    def legacy_get_connection():
+        nonlocal legacy_connects
+        legacy_connects += 1
+        conn = sqlite3.connect(db.DATABASE_NAME)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    db.get_connection = legacy_get_connection
+    try:
+        legacy_ms = timed(lambda: run_in_thread(lambda: simulate_overview_rerun(user_id)), reruns)
+    finally:
+        db.get_connection = pooled_get_connection
+
+    # After: pooled, pre-configured connections reused across rerun threads
+    run_in_thread(lambda: simulate_overview_rerun(user_id))  # warm the pool
+    connects_before = db.get_connection_stats()['connects']
+    pooled_ms = timed(lambda: run_in_thread(lambda: simulate_overview_rerun(user_id)), reruns)
+    pooled_connects = db.get_connection_stats()['connects'] - connects_before
+    db.CACHE_MAX_ENTRIES = cache_entries
+
+    print(f"  {'':<10}{'connects/rerun':>16}{'ms/rerun':>12}")
+    print(f"  {'before':<10}{legacy_connects / reruns:>16.1f}{legacy_ms:>12.2f}")
+    print(f"  {'after':<10}{pooled_connects / reruns:>16.1f}{pooled_ms:>12.2f}")
+
+# ─────────────────────────────────────────────
+# Read cache
+# ─────────────────────────────────────────────
+def count_statements(fn):
+    """Run fn on this thread and return how many SQL statements it issued"""
+    conn = db.get_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        conn.set_trace_callback(None)
+    return len(statements)
+
+def bench_read_cache():
+    header("Read cache on idle reruns")
+    user_id = seed(email="cache@example.com")
+    reruns = 20
+    cache_entries = db.CACHE_MAX_ENTRIES
+
+    db.CACHE_MAX_ENTRIES = 0
+    simulate_overview_rerun(user_id)  # the day's alert rollover happens here
+    uncached_sql = count_statements(lambda: simulate_overview_rerun(user_id))
+    uncached_ms = timed(lambda: simulate_overview_rerun(user_id), reruns)
+    db.CACHE_MAX_ENTRIES = cache_entries
+
+    db.clear_cache()
+    simulate_overview_rerun(user_id)  # first rerun fills the cache
+    stats_before = db.get_cache_stats()
+    cached_sql = count_statements(lambda: simulate_overview_rerun(user_id))
+    cached_ms = timed(lambda: simulate_overview_rerun(user_id), reruns)
+    stats = db.get_cache_stats()
+
+    print(f"  {'':<10}{'SQL/rerun':>12}{'ms/rerun':>12}")
+    print(f"  {'no cache':<10}{uncached_sql:>12}{uncached_ms:>12.2f}")
+    print(f"  {'cached':<10}{cached_sql:>12}{cached_ms:>12.2f}")
+    print(f"  hits {stats['hits'] - stats_before['hits']}, misses {stats['misses'] - stats_before['misses']}, "
+          f"entries {stats['entries']}")
+    assert cached_sql == 0, "idle rerun issued SQL"
+
+    # A write expires the shop's entries
+    customer_id = db.get_customers(user_id)[0]['id']
+    db.add_transaction(user_id, customer_id, "Debit", 100, date.today(), "Cache check")
+    assert count_statements(lambda: db.get_income_expense(user_id)) > 0, "write did not expire the cache"
+
+# ─────────────────────────────────────────────
+# Overview charts
+# ─────────────────────────────────────────────
+def overview_from_frames(user_id, start, end):
+    """What the overview used to do: load transactions twice and aggregate in pandas"""
+    import pandas as pd
+    filtered = db.get_transactions_frame(user_id, start, end)
+    filtered[filtered['type'] == 'Credit']['amount'].sum()
+    filtered[filtered['type'] == 'Debit']['amount'].sum()
+    df = db.get_transactions_frame(user_id)
+    df['date'] = pd.to_datetime(df['date'])
+    df['amount_signed'] = df.apply(lambda row: row['amount'] if row['type'] == 'Credit' else -row['amount'], axis=1)
+    df.groupby('date')['amount_signed'].sum()
+
+def overview_from_sql(user_id, start, end):
+    db.get_period_totals(user_id, start, end)
+    db.get_daily_totals(user_id, start, end)
+
+def bench_overview():
+    header("Overview charts (200k transactions, last 30 days)")
+    user_id = seed(transactions=200000, email="overview@example.com")
+    end = date.today()
+    start = end - timedelta(days=30)
+    cache_entries = db.CACHE_MAX_ENTRIES
+    db.CACHE_MAX_ENTRIES = 0
+    try:
+        frames_ms = timed(lambda: overview_from_frames(user_id, start, end), 3)
+        sql_ms = timed(lambda: overview_from_sql(user_id, start, end), 3)
+    finally:
+        db.CACHE_MAX_ENTRIES = cache_entries
+
+    print(f"  {'':<28}{'ms/rerun':>12}")
+    print(f"  {'pandas over transactions':<28}{frames_ms:>12.1f}")
+    print(f"  {'SQL daily aggregates':<28}{sql_ms:>12.1f}")
+
+# ─────────────────────────────────────────────
+# Customer picker
+# ─────────────────────────────────────────────
+def bench_customer_search():
+    header("Customer picker")
+    cache_entries = db.CACHE_MAX_ENTRIES
+    db.CACHE_MAX_ENTRIES = 0
+    print(f"  {'customers':<12}{'all: ms':>10}{'options':>10}{'search: ms':>12}{'options':>10}")
+    try:
+        for count in (1000, 50000):
+            user_id = seed(customers=count, transactions=0, email=f"search{count}@example.com")
+            all_ms = timed(lambda: {f"{c['name']} (ID: {c['id']})": c['id'] for c in db.get_customers(user_id)})
+            search_ms = timed(lambda: db.search_customers(user_id, "customer 12", limit=20))
+            options = len(db.search_customers(user_id, "customer 12", limit=20))
+            print(f"  {count:<12,}{all_ms:>10.2f}{count:>10,}{search_ms:>12.2f}{options:>10}")
+        
+        # Vowel signs are part of a word: 'राम' must not match 'रवि' as 'र' AND 'म'
+        user_id = seed(customers=0, transactions=0, email="search-hi@example.com")
+        for index, name in enumerate(("राम शर्मा", "रवि मेहता", "José Gómez")):
+            db.add_customer(user_id, name, f"70000000{index:02d}", "")
+        found = [c['name'] for c in db.search_customers(user_id, "राम")]
+        assert found == ["राम शर्मा"], found
+        found = [c['name'] for c in db.search_customers(user_id, "josé")]
+        assert found == ["José Gómez"], found
+        print("  ok: non-ASCII names (Devanagari, accented Latin) match whole words")
+    finally:
+        db.CACHE_MAX_ENTRIES = cache_entries
+
+# ─────────────────────────────────────────────
+# Scan-to-sale lookup
+# ─────────────────────────────────────────────
+def bench_item_scan():
+    header("Item lookup for a sale (50k items)")
+    user_id = seed(customers=10, items=50000, transactions=0, email="scan@example.com")
+    conn = db.get_connection()
+    conn.execute("UPDATE inventory SET sku = 'SKU' || id WHERE user_id=?", (user_id,))
+    conn.commit()
+    db.invalidate_cache(user_id)
+    code = conn.execute("SELECT sku FROM inventory WHERE user_id=? ORDER BY id DESC LIMIT 1", (user_id,)).fetchone()[0]
+
+    cache_entries = db.CACHE_MAX_ENTRIES
+    db.CACHE_MAX_ENTRIES = 0
+    try:
+        list_ms = timed(lambda: next(item for item in db.get_inventory(user_id) if item['sku'] == code))
+        scan_ms = timed(lambda: db.get_item_by_code(user_id, code))
+    finally:
+        db.CACHE_MAX_ENTRIES = cache_entries
+
+    print(f"  {'':<28}{'ms/lookup':>12}")
+    print(f"  {'load inventory list':<28}{list_ms:>12.2f}")
+    print(f"  {'get_item_by_code':<28}{scan_ms:>12.3f}")
+
+# ─────────────────────────────────────────────
+# Customer history grid
+# ─────────────────────────────────────────────
+def legacy_history_frames(transactions, trans_type=None):
+    """What the history used to send: the rows, then credit-only and debit-only copies (no filter)"""
+    import pandas as pd
+    df = pd.DataFrame(transactions)
+    df = df[['id', 'type', 'amount', 'date', 'description']]
+    df.columns = ['ID', 'Type', 'Amount (₹)', 'Date', 'Description']
+    columns = ['Date', 'Amount (₹)', 'Description']
+    return [df, df[df['Type'] == 'Credit'][columns], df[df['Type'] == 'Debit'][columns]]
+
+def history_frames(transactions, trans_type=None):
+    import pandas as pd
+    columns = {'id': 'ID', 'type': 'Type', 'amount': 'Amount (₹)', 'date': 'Date', 'description': 'Description'}
+    if trans_type:
+        del columns['type']
+    df = pd.DataFrame(transactions, columns=list(columns))
+    df.columns = list(columns.values())
+    return [df]
+
+def bench_history():
+    header("Customer history page (Arrow bytes sent per rerun)")
+    from streamlit.dataframe_util import convert_pandas_df_to_arrow_bytes
+    user_id = seed(customers=10, transactions=20000, email="history@example.com")
+    customer_id = db.get_connection().execute(
+        "SELECT customer_id FROM customer_balances WHERE user_id=? ORDER BY txn_count DESC LIMIT 1", (user_id,)
+    ).fetchone()[0]
+
+    def payload(build, trans_type=None):
+        transactions, _ = db.get_transactions_page(user_id, customer_id, limit=50, trans_type=trans_type)
+        return sum(len(convert_pandas_df_to_arrow_bytes(df)) for df in build(transactions, trans_type))
+    
+    def full_history_payload():
+        transactions = db.get_transactions(user_id, customer_id)
+        return sum(len(convert_pandas_df_to_arrow_bytes(df)) for df in legacy_history_frames(transactions))
+    
+    print(f"  {'':<34}{'bytes':>10}{'ms':>10}")
+    print(f"  {'full history, three tables':<34}{full_history_payload():>10,}{timed(full_history_payload, 3):>10.2f}")
+    for label, build, trans_type in (("50-row page, three tables", legacy_history_frames, None),
+                                     ("50-row page, one grid", history_frames, None),
+                                     ("50-row page, one grid, credit", history_frames, 'Credit')):
+        print(f"  {label:<34}{payload(build, trans_type):>10,}{timed(lambda: payload(build, trans_type)):>10.2f}")
+
+# ─────────────────────────────────────────────
+# Overdue customers
+# ─────────────────────────────────────────────
+def legacy_overdue_customers(user_id):
+    """The original settings.get_overdue_customers: every transaction re-filtered per customer"""
+    customers = db.get_customers(user_id)
+    transactions = db.get_transactions(user_id)
+    overdue_list = []
+    today = datetime.now()
+    for customer in customers:
+        cust_trans = [t for t in transactions if t['customer_id'] == customer['id']]
+        if cust_trans:
+            credit = sum(t['amount'] for t in cust_trans if t['type'] == 'Credit')
+            debit = sum(t['amount'] for t in cust_trans if t['type'] == 'Debit')
+            pending_amount = credit - debit
+            if pending_amount > 0:
+                last_date = max(datetime.strptime(t['date'], '%Y-%m-%d') for t in cust_trans)
+                days_diff = (today - last_date).days
+                if days_diff > 30:
+                    overdue_list.append({'customer_id': customer['id'], 'days_overdue': days_diff})
+    overdue_list.sort(key=lambda x: x['days_overdue'], reverse=True)
+    return overdue_list
+
+def grouped_overdue_from_transactions(user_id):
+    """Same answer as one GROUP BY over the raw transactions"""
+    conn = db.get_connection()
+    return conn.execute("""
+        SELECT customer_id,
+               SUM(CASE WHEN type = 'Credit' THEN amount ELSE -amount END) as pending_amount,
+               ? - MAX(date_day) as days_overdue
+        FROM transactions
+        WHERE user_id = ?
+        GROUP BY customer_id
+        HAVING pending_amount > 0 AND days_overdue > 30
+        ORDER BY days_overdue DESC
+    """, (db.today_day(), user_id)).fetchall()
+
+def bench_overdue():
+    header("Overdue customers")
+    cache_entries = db.CACHE_MAX_ENTRIES
+    db.CACHE_MAX_ENTRIES = 0
+    print(f"  {'customers/transactions':<24}{'method':<32}{'ms':>10}")
+    try:
+        # The original loop is quadratic, so it only runs at the small size
+        small = seed(customers=1000, transactions=100000, email="overdue-small@example.com")
+        legacy_ms = timed(lambda: legacy_overdue_customers(small), 1)
+        print(f"  {'1k / 100k':<24}{'Python loop (original)':<32}{legacy_ms:>10.1f}")
+        assert len(legacy_overdue_customers(small)) == len(db.get_overdue_customers(small))
+
+        large = seed(customers=10000, transactions=1000000, email="overdue-large@example.com")
+        for label, fn in (("GROUP BY transactions", grouped_overdue_from_transactions),
+                          ("get_overdue_customers", db.get_overdue_customers),
+                          ("get_overdue_alerts", db.get_overdue_alerts)):
+            print(f"  {'10k / 1M':<24}{label:<32}{timed(lambda: fn(large), 3):>10.1f}")
+        print(f"  overdue customers at 10k / 1M: {len(db.get_overdue_customers(large))}")
+    finally:
+        db.CACHE_MAX_ENTRIES = cache_entries
+
+# ─────────────────────────────────────────────
+# Reminder candidates
+# ─────────────────────────────────────────────
+def legacy_customers_needing_reminders(user_id):
+    """The original loop: overdue customers, then up to three lookups per customer"""
+    import auto_reminders
+    reminders_needed = {10: [], 20: [], 30: []}
+    for customer in db.get_overdue_customers(user_id):
+        days = customer['days_overdue']
+        customer_id = customer['customer_id']
+        if days >= 30 and not auto_reminders.check_reminder_sent(user_id, customer_id, 30):
+            reminders_needed[30].append(customer)
+        elif days >= 20 and not auto_reminders.check_reminder_sent(user_id, customer_id, 20):
+            reminders_needed[20].append(customer)
+        elif days >= 10 and not auto_reminders.check_reminder_sent(user_id, customer_id, 10):
+            reminders_needed[10].append(customer)
+    return reminders_needed
+
+def bench_reminder_candidates():
+    header("Reminder candidates")
+    import auto_reminders
+    cache_entries = db.CACHE_MAX_ENTRIES
+    db.CACHE_MAX_ENTRIES = 0
+    print(f"  {'customers':<12}{'overdue':>10}{'method':>14}{'SQL':>8}{'ms':>10}")
+    try:
+        for count in (1000, 10000):
+            user_id = seed(customers=count, transactions=count * 20, email=f"reminders{count}@example.com")
+            conn = db.get_connection()
+            # Flag from 5 days so every bucket fills, and mark some reminders as already sent
+            conn.execute("INSERT INTO alert_settings(user_id, overdue_days) VALUES(?, 5)", (user_id,))
+            overdue = db.get_overdue_customers(user_id)
+            sent_date = date.today().strftime('%Y-%m-%d')
+            conn.executemany("""
+                INSERT INTO payment_reminders(user_id, customer_id, reminder_day, sent_date, pending_amount, days_overdue)
+                VALUES(?,?,?,?,?,?)
+            """, [(user_id, c['customer_id'], random.choice([10, 20, 30]), sent_date, c['pending_amount'], c['days_overdue'])
+                  for c in overdue[::3]])
+            conn.commit()
+
+            assert legacy_customers_needing_reminders(user_id) == auto_reminders.get_customers_needing_reminders(user_id)
+            for label, fn in (("loop", legacy_customers_needing_reminders),
+                              ("one query", auto_reminders.get_customers_needing_reminders)):
+                statements = count_statements(lambda: fn(user_id))
+                print(f"  {count:<12,}{len(overdue):>10,}{label:>14}{statements:>8,}{timed(lambda: fn(user_id), 3):>10.1f}")
+    finally:
+        db.CACHE_MAX_ENTRIES = cache_entries
+
+def bench_reminder_scheduler():
+    header("Reminder scheduler (40 shops x 300 customers, 1 ms per send)")
+    import auto_reminders
+    for shop in range(40):
+        seed(customers=300, items=0, transactions=3000, email=f"scheduler{shop}@example.com")
+    today = db.today_day()
+
+    def dispatch(shop, customer, message):
+        time.sleep(0.001)  # stands in for the network call to the messaging provider
+
+    print(f"  {'workers':<10}{'sent':>8}{'seconds':>10}{'shops/s':>10}{'p95 ms':>10}")
+    # Each run pins a later day so the previous run's reminders are outside the dedupe window
+    for offset, workers in enumerate((1, 4, 8)):
+        stats = auto_reminders.run_reminders(workers=workers, dispatch=dispatch, today=today + 2 * (offset + 1))
+        assert not stats['failed'] and not stats['errors']
+        print(f"  {workers:<10}{sum(stats['sent'].values()):>8,}{stats['seconds']:>10.2f}"
+              f"{stats['shops_per_second']:>10.1f}{stats['latency_ms']['p95']:>10.1f}")
+    # Two schedulers on the same day at once: neither may log a reminder the other already claimed
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        runs = [pool.submit(auto_reminders.run_reminders, 8, dispatch, today + 6) for _ in range(2)]
+        assert not any(run.result()['failed'] or run.result()['errors'] for run in runs)
+    duplicates = db.get_connection().execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM payment_reminders GROUP BY user_id, customer_id, reminder_day, sent_date HAVING COUNT(*) > 1
+        )
+    """).fetchone()[0]
+    assert duplicates == 0, f"{duplicates} reminders sent twice on the same day"
+
+# ─────────────────────────────────────────────
+# Email outbox
+# ─────────────────────────────────────────────
+class SMTPStandIn(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; EHLO waits HANDSHAKE_SECONDS to stand in for STARTTLS + login"""
+    HANDSHAKE_SECONDS = 0.02
+    received = 0
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 bench ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                time.sleep(self.HANDSHAKE_SECONDS)
+                self.reply("250 bench")
+            elif command == b"DATA":
+                self.reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                SMTPStandIn.received += 1
+                self.reply("250 queued")
+            elif command == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+def bench_outbox():
+    header("Email outbox against a local SMTP stand-in")
+    import smtplib
+    import outbox
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+
+    def smtp_factory(config):
+        return smtplib.SMTP(host, port, timeout=10)
+
+    user_id = seed(customers=0, items=0, transactions=0, email="outbox@example.com")
+    account = "shop@example.com"
+    outbox.register_account(user_id, {'smtp_email': account, 'smtp_password': 'x'})
+    count = 500
+    html, text = "<p>Your balance is due.</p>", "Your balance is due."
+    rate_limit = outbox.RATE_LIMIT_PER_MINUTE
+    try:
+        # Before: connect, handshake, send and quit for every email
+        start = time.perf_counter()
+        for i in range(count):
+            message = outbox._build_message({'subject': "Reminder", 'account': account,
+                                             'to_email': f"c{i}@example.com", 'text_body': text, 'html_body': html})
+            with smtp_factory(None) as connection:
+                connection.send_message(message)
+        direct_rate = count / (time.perf_counter() - start)
+
+        # After: queue everything, then drain in batches over one connection per batch
+        outbox.RATE_LIMIT_PER_MINUTE = 0
+        for i in range(count):
+            outbox.enqueue_email(user_id, account, f"c{i}@example.com", "Reminder", html, text)
+        start = time.perf_counter()
+        totals = outbox.drain_outbox(smtp_factory)
+        outbox_rate = count / (time.perf_counter() - start)
+        assert totals['sent'] == count and outbox.get_outbox_status(user_id)['sent'] == count
+
+        print(f"  {'':<32}{'msgs/s':>10}")
+        print(f"  {'connection per email':<32}{direct_rate:>10.0f}")
+        print(f"  {'outbox, batch of ' + str(outbox.BATCH_SIZE):<32}{outbox_rate:>10.0f}")
+
+        # A failed send is retried later, not lost
+        calls = 0
+
+        def flaky_factory(config):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise smtplib.SMTPConnectError(421, "try again later")
+            return smtp_factory(config)
+
+        outbox_id = outbox.enqueue_email(user_id, account, "retry@example.com", "Reminder", html, text)
+        assert outbox.drain_outbox(flaky_factory)['retried'] == 1
+        conn = db.get_connection()
+        conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (outbox_id,))
+        conn.commit()
+        assert outbox.drain_outbox(flaky_factory)['sent'] == 1
+
+        # The rate limit holds back the rest of the queue until the window frees up
+        outbox.RATE_LIMIT_PER_MINUTE = 10
+        outbox._sent_times.clear()
+        for i in range(25):
+            outbox.enqueue_email(user_id, account, f"limited{i}@example.com", "Reminder", html, text)
+        totals = outbox.drain_outbox(smtp_factory)
+        assert totals['sent'] == 10 and totals['deferred'] == 15, totals
+        print(f"  ok: retry after a failed connect, {totals['sent']} sent / {totals['deferred']} deferred at 10/min")
+        conn.execute("UPDATE outbox SET status = 'sent' WHERE user_id = ? AND status = 'pending'", (user_id,))
+        conn.commit()
+        outbox.RATE_LIMIT_PER_MINUTE = 0
+        
+        # Two shops sharing the sender address keep their own passwords
+        other_id = seed(customers=0, items=0, transactions=0, email="outbox2@example.com")
+        outbox.register_account(other_id, {'smtp_email': account, 'smtp_password': 'y'})
+        passwords = []
+        
+        def recording_factory(config):
+            passwords.append(config['smtp_password'])
+            return smtp_factory(config)
+        
+        outbox.enqueue_email(user_id, account, "first@example.com", "Reminder", html, text)
+        outbox.enqueue_email(other_id, account, "second@example.com", "Reminder", html, text)
+        assert outbox.drain_outbox(recording_factory)['sent'] == 2 and sorted(passwords) == ['x', 'y'], passwords
+        
+        # A refused login pauses the shop's account; its rows wait without using up attempts
+        def refusing_factory(config):
+            raise smtplib.SMTPAuthenticationError(535, b"bad credentials")
+        
+        outbox_id = outbox.enqueue_email(other_id, account, "paused@example.com", "Reminder", html, text)
+        totals = outbox.drain_outbox(refusing_factory)
+        assert totals['deferred'] == 1 and not totals['failed'] and outbox.get_login_error(other_id, account)
+        conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (outbox_id,))
+        conn.commit()
+        assert outbox.drain_outbox(smtp_factory)['deferred'] == 1  # still paused: no credentials to try
+        outbox.register_account(other_id, {'smtp_email': account, 'smtp_password': 'z'})
+        conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (outbox_id,))
+        conn.commit()
+        assert outbox.drain_outbox(smtp_factory)['sent'] == 1
+        attempts = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (outbox_id,)).fetchone()[0]
+        assert attempts == 1, attempts
+        print("  ok: per-shop credentials, refused login pauses the account without using up attempts")
+        
+        # An unexpected error on one message costs that row an attempt; the rest of the batch is recorded
+        def picky_factory(config):
+            connection = smtp_factory(config)
+            send = connection.send_message
+            
+            def send_message(message):
+                if message["To"] == "broken@example.com":
+                    raise ValueError("bad header")
+                return send(message)
+            
+            connection.send_message = send_message
+            return connection
+        
+        outbox.enqueue_email(user_id, account, "before@example.com", "Reminder", html, text)
+        broken_id = outbox.enqueue_email(user_id, account, "broken@example.com", "Reminder", html, text)
+        outbox.enqueue_email(user_id, account, "after@example.com", "Reminder", html, text)
+        totals = outbox.drain_outbox(picky_factory)
+        assert totals['sent'] == 2 and totals['retried'] == 1, totals
+        row = conn.execute("SELECT status, attempts FROM outbox WHERE id = ?", (broken_id,)).fetchone()
+        assert tuple(row) == ('pending', 1), tuple(row)
+        print("  ok: an unexpected send error is retried for its row only")
+    finally:
+        outbox.RATE_LIMIT_PER_MINUTE = rate_limit
+        server.shutdown()
+
+# ─────────────────────────────────────────────
+# Email templates
+# ─────────────────────────────────────────────
+def legacy_overdue_email(overdue_customers, shop_name):
+    """The original generator: body += per row with inline styles, then .replace passes for text"""
+    body = f"""
+    <h2 style="color: #e67e22;">💰 Overdue Payment Alert - {shop_name}</h2>
+    <table style="border-collapse: collapse; width: 100%; margin: 10px 0;">
+    """
+    for customer in overdue_customers:
+        body += f"""
+        <tr>
+            <td style="border: 1px solid #ddd; padding: 8px;">{customer['customer_name']}</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: right;">₹{customer['pending_amount']:,.2f}</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center; color: #e67e22;"><b>{customer['days_overdue']}</b></td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{customer['last_transaction_date']}</td>
+        </tr>
+        """
+    body += "</table>"
+    text_body = body.replace('<br>', '\n').replace('<b>', '').replace('</b>', '')
+    return body, text_body
+
+def bench_email_templates():
+    header("Overdue payment email rendering")
+    import email_helper
+    import email_templates
+    print(f"  {'rows':<10}{'method':<20}{'ms':>10}{'us/row':>10}{'HTML KB':>10}")
+    for count in (1000, 10000, 40000):
+        customers = [{'customer_name': f"Customer {i}", 'pending_amount': 1000.0 + i, 'days_overdue': 30 + i % 90,
+                      'last_transaction_date': "2026-01-15"} for i in range(count)]
+        repeat = max(3, 20000 // count)  # small renders take a few ms: more samples for a stable median
+        legacy_ms = timed(lambda: legacy_overdue_email(customers, "Bench Store"), repeat)
+        legacy_kb = len(legacy_overdue_email(customers, "Bench Store")[0]) / 1024
+        render = lambda: email_templates.render(email_helper.generate_overdue_payment_email(customers, "Bench Store"))
+        render_ms = timed(render, repeat)
+        render_kb = len(render()[0]) / 1024
+        print(f"  {count:<10,}{'body += (original)':<20}{legacy_ms:>10.1f}{legacy_ms * 1000 / count:>10.2f}{legacy_kb:>10,.0f}")
+        print(f"  {count:<10,}{'blocks + render':<20}{render_ms:>10.1f}{render_ms * 1000 / count:>10.2f}{render_kb:>10,.0f}")
+
+# ─────────────────────────────────────────────
+# Reminder history retention
+# ─────────────────────────────────────────────
+def legacy_reminder_stats(user_id):
+    """The original get_reminder_stats: three separate passes over payment_reminders"""
+    conn = db.get_connection()
+    total = conn.execute("SELECT COUNT(*) FROM payment_reminders WHERE user_id = ?", (user_id,)).fetchone()[0]
+    since = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    recent = conn.execute("SELECT COUNT(*) FROM payment_reminders WHERE user_id = ? AND sent_date >= ?",
+                          (user_id, since)).fetchone()[0]
+    by_day = dict(conn.execute("SELECT reminder_day, COUNT(*) FROM payment_reminders WHERE user_id = ? GROUP BY reminder_day",
+                               (user_id,)).fetchall())
+    return total, recent, by_day
+
+def bench_reminder_retention():
+    header("Reminder panel after 3 years of daily runs (1M reminders)")
+    import auto_reminders
+    user_id = seed(customers=1000, items=0, transactions=0, email="retention@example.com")
+    conn = db.get_connection()
+    customer_ids = [row[0] for row in conn.execute("SELECT id FROM customers WHERE user_id=?", (user_id,))]
+    today = db.today_day()
+    conn.executemany("""
+        INSERT INTO payment_reminders(user_id, customer_id, reminder_day, sent_date, pending_amount, days_overdue)
+        VALUES(?,?,?,?,?,?)
+    """, ((user_id, customer_ids[i % 1000], random.choice([10, 20, 30]),
+           db.from_day(today - i // 1000).strftime('%Y-%m-%d'), 1000.0, 30) for i in range(1000000)))
+    conn.commit()
+    customer_id = customer_ids[0]
+
+    def panel(stats):
+        stats(user_id)
+        auto_reminders.get_reminder_history(user_id)
+        auto_reminders.get_reminder_history(user_id, customer_id)
+
+    # Before: no history indexes, no archive, three stats passes
+    conn.execute("DROP INDEX idx_payment_reminders_user_sent")
+    conn.execute("DROP INDEX idx_payment_reminders_customer_sent")
+    before_ms = timed(lambda: panel(legacy_reminder_stats), 3)
+    conn.execute("CREATE INDEX idx_payment_reminders_user_sent ON payment_reminders(user_id, sent_date)")
+    conn.execute("CREATE INDEX idx_payment_reminders_customer_sent ON payment_reminders(user_id, customer_id, sent_date)")
+    conn.commit()
+    indexed_ms = timed(lambda: panel(auto_reminders.get_reminder_stats), 3)
+
+    stats_before = auto_reminders.get_reminder_stats(user_id)
+    start = time.perf_counter()
+    archived = auto_reminders.archive_reminders()
+    archive_seconds = time.perf_counter() - start
+    archived_ms = timed(lambda: panel(auto_reminders.get_reminder_stats), 3)
+    assert auto_reminders.get_reminder_stats(user_id) == stats_before, "archiving changed the stats"
+
+    print(f"  {'':<36}{'ms/panel':>10}")
+    print(f"  {'original (no index, 3 stat passes)':<36}{before_ms:>10.1f}")
+    print(f"  {'history indexes + grouped stats':<36}{indexed_ms:>10.1f}")
+    print(f"  {'+ archive past 90 days':<36}{archived_ms:>10.1f}")
+    print(f"  archived {archived:,} reminders in {archive_seconds:.1f} s")
+
+# ─────────────────────────────────────────────
+# Bulk transaction ingest
+# ─────────────────────────────────────────────
+def make_sale_rows(user_id, count):
+    """Build a day's worth of khata entries: two sales for every payment"""
+    conn = db.get_connection()
+    customer_ids = [row[0] for row in conn.execute("SELECT id FROM customers WHERE user_id=?", (user_id,))]
+    item_ids = [row[0] for row in conn.execute("SELECT id FROM inventory WHERE user_id=?", (user_id,))]
+    conn.execute("UPDATE inventory SET quantity = 1000000 WHERE user_id=?", (user_id,))
+    conn.commit()
+    db.invalidate_cache(user_id)
+
+    today = date.today().strftime('%Y-%m-%d')
+    rows = []
+    for i in range(count):
+        if i % 3 == 2:
+            rows.append({'customer_id': random.choice(customer_ids), 'type': 'Debit', 'amount': 500,
+                         'date': today, 'description': 'Payment received'})
+        else:
+            rows.append({'customer_id': random.choice(customer_ids), 'type': 'Credit', 'amount': 120,
+                         'date': today, 'description': 'Sale', 'item_id': random.choice(item_ids),
+                         'quantity': 2})
+    return rows
+
+def bench_bulk_ingest():
+    header("Bulk transaction ingest")
+    count = 2000
+
+    user_id = seed(transactions=0, email="loop@example.com")
+    rows = make_sale_rows(user_id, count)
+    start = time.perf_counter()
+    for row in rows:
+        db.add_transaction(user_id, row['customer_id'], row['type'], row['amount'], row['date'],
+                           row['description'], row.get('item_id'), row.get('quantity'))
+    loop_seconds = time.perf_counter() - start
+
+    user_id = seed(transactions=0, email="bulk@example.com")
+    rows = make_sale_rows(user_id, count)
+    start = time.perf_counter()
+    results = db.add_transactions_bulk(user_id, rows)
+    bulk_seconds = time.perf_counter() - start
+    assert all(success for success, _ in results)
+    assert not db.verify_daily_summary(), "daily summary drifted"
+
+    print(f"  {'':<24}{'rows/sec':>12}")
+    print(f"  {'add_transaction loop':<24}{count / loop_seconds:>12,.0f}")
+    print(f"  {'add_transactions_bulk':<24}{count / bulk_seconds:>12,.0f}")
+    print(f"  speed-up: {loop_seconds / bulk_seconds:.0f}x")
+
+# ─────────────────────────────────────────────
+# Concurrent sales on one item
+# ─────────────────────────────────────────────
+def stress_concurrent_sales(user_id, customer_id, writers, stock=2000):
+    """Writers sell one unit at a time until the item runs out"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO inventory(user_id, item_name, quantity, price_per_unit) VALUES(?,?,?,?)",
+                   (user_id, f"Contended item ({writers} writers)", stock, 10.0))
+    item_id = cursor.lastrowid
+    conn.commit()
+
+    sold = [0] * writers
+    errors = []
+    today = date.today().strftime('%Y-%m-%d')
+
+    def cashier(slot):
+        while True:
+            success, message = db.add_transaction(user_id, customer_id, "Credit", 10.0, today,
+                                                  "Stress sale", item_id, 1)
+            if success:
+                sold[slot] += 1
+            elif message.startswith("Insufficient"):
+                return
+            else:
+                errors.append(message)
+                return
+
+    threads = [threading.Thread(target=cashier, args=(slot,)) for slot in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    remaining = conn.execute("SELECT quantity FROM inventory WHERE id=?", (item_id,)).fetchone()[0]
+    return sum(sold), remaining, errors, seconds
+
+def bench_concurrent_sales():
+    header("Concurrent sales (no overselling)")
+    user_id = seed(transactions=0, email="stress@example.com")
+    customer_id = db.get_customers(user_id)[0]['id']
+    stock = 2000
+
+    print(f"  {'writers':<10}{'sold':>8}{'left':>8}{'errors':>8}{'sales/sec':>12}")
+    for writers in (8, 32):
+        sold, remaining, errors, seconds = stress_concurrent_sales(user_id, customer_id, writers, stock)
+        print(f"  {writers:<10}{sold:>8}{remaining:>8}{len(errors):>8}{sold / seconds:>12,.0f}")
+        assert remaining >= 0, "stock went negative"
+        assert sold + remaining == stock, "sales and stock don't add up"
+        assert not errors, errors[0]
+    assert not db.verify_customer_balances(), "customer balances drifted"
+    assert not db.verify_daily_summary(), "daily summary drifted"
+
+# ─────────────────────────────────────────────
+# DataFrame read path
+# ─────────────────────────────────────────────
+def measure(fn):
+    """Run fn once and return (seconds, peak traced memory in MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    del result
+    return seconds, peak
+
+def bench_frames():
+    header("Transactions DataFrame (1M rows)")
+    import pandas as pd
+    user_id = seed(customers=1000, transactions=1000000, email="frames@example.com")
+
+    dict_seconds, dict_peak = measure(lambda: pd.DataFrame(db.get_transactions(user_id)))
+    frame_seconds, frame_peak = measure(lambda: db.get_transactions_frame(user_id))
+
+    print(f"  {'':<28}{'seconds':>10}{'peak MB':>10}")
+    print(f"  {'DataFrame(get_transactions)':<28}{dict_seconds:>10.2f}{dict_peak:>10.0f}")
+    print(f"  {'get_transactions_frame':<28}{frame_seconds:>10.2f}{frame_peak:>10.0f}")
+
+# ─────────────────────────────────────────────
+# Cold start imports
+# ─────────────────────────────────────────────
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Heavy modules the landing page must not load
+HOME_FORBIDDEN_MODULES = ('pandas', 'numpy', 'matplotlib', 'smtplib')
+
+def import_times(code):
+    """Run code in a fresh interpreter with -X importtime; returns {module: (self_us, cumulative_us)}"""
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=os.getcwd(), env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # column header
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def bench_imports():
+    header("Cold start imports (home page)")
+    # Run app.py the way Streamlit does for a first visit (bare mode, page = home)
+    times = import_times(f"import runpy; runpy.run_path({os.path.join(PACKAGE_DIR, 'app.py')!r})")
+    total_ms = sum(self_us for self_us, _ in times.values()) / 1000
+    own_ms = sum(times[name][0] for name in ('database', 'migrations') if name in times) / 1000
+
+    print(f"  modules imported: {len(times)}, total import time: {total_ms:.0f} ms (app modules {own_ms:.1f} ms)")
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (_, cumulative_us) in [item for item in slowest if '.' not in item[0]][:5]:
+        print(f"  {name:<28}{cumulative_us / 1000:>10.1f} ms")
+
+    loaded = [name for name in HOME_FORBIDDEN_MODULES if name in times]
+    assert not loaded, f"home page imports {', '.join(loaded)}"
+    print("  ok: no " + ", ".join(HOME_FORBIDDEN_MODULES))
+
+# ─────────────────────────────────────────────
+# MAIN
+# ─────────────────────────────────────────────
+BENCHMARKS = {
+    'connections': bench_connections,
+    'cache': bench_read_cache,
+    'overview': bench_overview,
+    'search': bench_customer_search,
+    'scan': bench_item_scan,
+    'history': bench_history,
+    'overdue': bench_overdue,
+    'reminders': bench_reminder_candidates,
+    'scheduler': bench_reminder_scheduler,
+    'outbox': bench_outbox,
+    'templates': bench_email_templates,
+    'retention': bench_reminder_retention,
+    'bulk': bench_bulk_ingest,
+    'concurrency': bench_concurrent_sales,
+    'frames': bench_frames,
+    'imports': bench_imports,
+}
+
+def main():
+    args = sys.argv[1:]
+    keep = "--keep" in args
+    names = [arg for arg in args if arg != "--keep"] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Choose from: {', '.join(BENCHMARKS)}")
+            sys.exit(2)
+    
+    # Work inside a throwaway folder so the relative database path resolves there
+    work_dir = tempfile.mkdtemp(prefix="vyapar_bench_")
+    start_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        print(f"Scratch database: {os.path.join(work_dir, db.DATABASE_NAME)}")
+        db.init_db()
+        for name in names:
+            BENCHMARKS[name]()
+    finally:
+        os.chdir(start_dir)
+        if keep:
+            print(f"\nKept {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
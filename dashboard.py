@@ -1,16 +1,17 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import database as db
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+
+# Rows per page in the customer transaction history
+HISTORY_PAGE_SIZE = 50
+
+# Customers offered by the transaction page's customer picker
+CUSTOMER_SEARCH_LIMIT = 20
 
 def get_notification_count(user_id):
     """Get total notification count"""
-    from settings import get_low_stock_items, get_overdue_customers
-    low_stock = get_low_stock_items(user_id)
-    overdue = get_overdue_customers(user_id)
-    return len(low_stock) + len(overdue)
+    return db.get_alert_count(user_id)
 
 def show_dashboard():
     """Main dashboard function"""
@@ -37,10 +38,9 @@ def show_dashboard():
     
     # Initialize date range in session state
     if 'date_range' not in st.session_state:
-        from datetime import datetime, timedelta
         st.session_state.date_range = {
-            'start': datetime.now() - timedelta(days=30),
-            'end': datetime.now()
+            'start': date.today() - timedelta(days=30),
+            'end': date.today()
         }
     
     filter_option = st.sidebar.selectbox(
@@ -48,26 +48,24 @@ def show_dashboard():
         ["All Time", "This Week", "This Month", "Last 30 Days", "Custom Range"]
     )
     
-    # Set date range based on selection
-    from datetime import datetime, timedelta
+    # Set date range based on selection (both ends inclusive, whole days)
+    today = date.today()
     
     if filter_option == "This Week":
-        start_date = datetime.now() - timedelta(days=datetime.now().weekday())
-        end_date = datetime.now()
+        start_date = today - timedelta(days=today.weekday())
+        end_date = today
     elif filter_option == "This Month":
-        start_date = datetime.now().replace(day=1)
-        end_date = datetime.now()
+        start_date = today.replace(day=1)
+        end_date = today
     elif filter_option == "Last 30 Days":
-        start_date = datetime.now() - timedelta(days=30)
-        end_date = datetime.now()
+        start_date = today - timedelta(days=30)
+        end_date = today
     elif filter_option == "Custom Range":
         col1, col2 = st.sidebar.columns(2)
         with col1:
             start_date = st.date_input("From", value=st.session_state.date_range['start'])
         with col2:
             end_date = st.date_input("To", value=st.session_state.date_range['end'])
-        start_date = datetime.combine(start_date, datetime.min.time())
-        end_date = datetime.combine(end_date, datetime.max.time())
     else:  # All Time
         start_date = None
         end_date = None
@@ -159,23 +157,11 @@ def show_overview(user_id, start_date=None, end_date=None):
     customers = db.get_customers(user_id)
     inventory_value = db.get_total_inventory_value(user_id)
     
-    # Get transactions with date filter
-    if start_date and end_date:
-        transactions = db.get_transactions_filtered(user_id, start_date.strftime('%Y-%m-%d'), 
-                                                    end_date.strftime('%Y-%m-%d'))
-    else:
-        transactions = db.get_transactions(user_id)
-    
-    # Calculate metrics from filtered transactions
-    if transactions:
-        trans_df = pd.DataFrame(transactions)
-        income = trans_df[trans_df['type'] == 'Credit']['amount'].sum()
-        expense = trans_df[trans_df['type'] == 'Debit']['amount'].sum()
-        net_balance = income - expense
-    else:
-        income = 0
-        expense = 0
-        net_balance = 0
+    # Totals for the selected period, summed in SQL
+    totals = db.get_period_totals(user_id, start_date, end_date)
+    income = totals['credit']
+    expense = totals['debit']
+    net_balance = income - expense
     
     # Key Metrics
     st.subheader("Key Metrics")
@@ -196,7 +182,7 @@ def show_overview(user_id, start_date=None, end_date=None):
     st.subheader("📈 Business Analytics")
     
     # Graph Type Selection
-    col_select1, col_select2 = st.columns([3, 1])
+    col_select1, col_select2, col_select3 = st.columns([3, 1, 1])
     
     with col_select1:
         graph_type = st.radio(
@@ -214,31 +200,32 @@ def show_overview(user_id, start_date=None, end_date=None):
                 help="Choose visualization style"
             )
     
+    with col_select3:
+        group_by = st.selectbox(
+            "Group by:",
+            ["Day", "Week", "Month"],
+            help="Long ranges read better by week or month"
+        )
+    
     # Graph 1: Transaction Trends - Toggle between Normal and Detailed
-    st.markdown("#### 📈 Daily Transaction Trends")
+    period_label = {"Day": "Daily", "Week": "Weekly", "Month": "Monthly"}[group_by]
+    st.markdown(f"#### 📈 {period_label} Transaction Trends")
     
-    transactions = db.get_transactions(user_id)
+    daily_totals = db.get_daily_totals(user_id, start_date, end_date, group_by.lower())
     
-    if transactions and len(transactions) > 0:
-        df = pd.DataFrame(transactions)
-        df['date'] = pd.to_datetime(df['date'])
+    if daily_totals:
+        df = pd.DataFrame(daily_totals)
+        df['date'] = pd.to_datetime(df['date_day'], unit='D')
         
         if "Normal" in graph_type:
             # NORMAL VIEW: Simple Bar or Line Chart showing Profit/Loss
-            st.caption("Simple view showing daily net profit/loss")
+            st.caption(f"Simple view showing {period_label.lower()} net profit/loss")
             
-            # Create daily net profit/loss
-            df_daily = df.copy()
-            df_daily['amount_signed'] = df_daily.apply(
-                lambda row: row['amount'] if row['type'] == 'Credit' else -row['amount'], 
-                axis=1
-            )
-            
-            # Group by date and sum
-            daily_net = df_daily.groupby('date')['amount_signed'].sum().reset_index()
-            daily_net.columns = ['Date', 'Profit/Loss (₹)']
-            daily_net = daily_net.set_index('Date')
-            daily_net = daily_net.sort_index()
+            # Net profit/loss per period
+            daily_net = pd.DataFrame({
+                'Date': df['date'],
+                'Profit/Loss (₹)': df['credit'] - df['debit']
+            }).set_index('Date')
             
             # Display based on selected style
             if normal_graph_style == "Bar Chart":
@@ -258,28 +245,23 @@ def show_overview(user_id, start_date=None, end_date=None):
             col_a, col_b, col_c = st.columns(3)
             with col_a:
                 total_profit_days = len(daily_net[daily_net['Profit/Loss (₹)'] > 0])
-                st.metric("Profitable Days", f"{total_profit_days} days", delta="Positive")
+                st.metric(f"Profitable {group_by}s", f"{total_profit_days} {group_by.lower()}s", delta="Positive")
             with col_b:
                 total_loss_days = len(daily_net[daily_net['Profit/Loss (₹)'] < 0])
-                st.metric("Loss Days", f"{total_loss_days} days", delta="Negative", delta_color="inverse")
+                st.metric(f"Loss {group_by}s", f"{total_loss_days} {group_by.lower()}s", delta="Negative", delta_color="inverse")
             with col_c:
                 avg_daily_profit = daily_net['Profit/Loss (₹)'].mean()
-                st.metric("Avg Daily P/L", f"₹{avg_daily_profit:,.2f}")
+                st.metric(f"Avg {period_label} P/L", f"₹{avg_daily_profit:,.2f}")
         
         else:
             # DETAILED VIEW: Area Chart with Credit and Debit
             st.caption("Detailed view showing Credit (Sales) and Debit (Payments)")
             
-            # Create separate series for Credit and Debit
-            df_credit = df[df['type'] == 'Credit'].groupby('date')['amount'].sum().reset_index()
-            df_credit.columns = ['Date', 'Credit (Sales)']
-            
-            df_debit = df[df['type'] == 'Debit'].groupby('date')['amount'].sum().reset_index()
-            df_debit.columns = ['Date', 'Debit (Payments)']
-            
-            # Merge and fill missing dates with 0
-            df_combined = pd.merge(df_credit, df_debit, on='Date', how='outer').fillna(0)
-            df_combined = df_combined.sort_values('Date')
+            df_combined = pd.DataFrame({
+                'Date': df['date'],
+                'Credit (Sales)': df['credit'],
+                'Debit (Payments)': df['debit']
+            })
             
             # Calculate net profit/loss (Calculated but not plotted in a separate chart now)
             df_combined['Net Profit/Loss'] = df_combined['Credit (Sales)'] - df_combined['Debit (Payments)']
@@ -301,12 +283,12 @@ def show_overview(user_id, start_date=None, end_date=None):
         st.divider()
         col_a, col_b, col_c = st.columns(3)
         with col_a:
-            st.metric("Total Transactions", len(transactions))
+            st.metric("Total Transactions", totals['txn_count'])
         with col_b:
-            total_credit = df[df['type'] == 'Credit']['amount'].sum()
+            total_credit = totals['credit']
             st.metric("Total Credit", f"₹{total_credit:,.2f}")
         with col_c:
-            total_debit = df[df['type'] == 'Debit']['amount'].sum()
+            total_debit = totals['debit']
             st.metric("Total Debit", f"₹{total_debit:,.2f}")
         
         # Add profit/loss indicator
@@ -454,16 +436,22 @@ def customer_transactions(user_id):
     """Handle customer transactions"""
     st.title("💳 Customer Transactions")
     
-    customers = db.get_customers(user_id)
+    # Select Customer: search on the server and only offer the top matches
+    search = st.text_input("🔍 Search Customer", placeholder="Type a name or phone number")
+    customers = db.search_customers(user_id, search, limit=CUSTOMER_SEARCH_LIMIT)
     
     if not customers:
-        st.warning("No customers available. Please add customers first!")
+        if search:
+            st.warning("No customers match your search.")
+        else:
+            st.warning("No customers available. Please add customers first!")
         return
     
-    # Select Customer
     customer_options = {f"{c['name']} (ID: {c['id']})": c['id'] for c in customers}
     selected_customer = st.selectbox("Select Customer", options=list(customer_options.keys()))
     customer_id = customer_options[selected_customer]
+    if len(customers) == CUSTOMER_SEARCH_LIMIT:
+        st.caption(f"Showing the top {CUSTOMER_SEARCH_LIMIT} matches - type more to narrow down")
     
     st.markdown("---")
     
@@ -480,46 +468,77 @@ def customer_transactions(user_id):
     
     date = st.date_input("Date", value=datetime.now())
     
-    # Get inventory items
-    inventory = db.get_inventory(user_id)
-    
     # Item selection for Credit transactions (sales)
     selected_item_id = None
+    selected_item_data = None
     quantity_sold = None
     description = ""
     
     if trans_type == "Credit":
-        st.markdown("**📦 Select Item from Inventory**")
-        
-        if inventory:
-            # Create item options with stock info
-            item_options = {
-                f"{item['item_name']} (Stock: {item['quantity']}, Price: ₹{item['price_per_unit']})": item['id'] 
-                for item in inventory
-            }
-            
-            selected_item = st.selectbox("Select Item *", options=list(item_options.keys()))
-            selected_item_id = item_options[selected_item]
-            
-            # Get selected item details
-            selected_item_data = next(item for item in inventory if item['id'] == selected_item_id)
-            
-            quantity_sold = st.number_input(
-                f"Quantity (Available: {selected_item_data['quantity']})", 
-                min_value=1, 
-                max_value=selected_item_data['quantity'],
-                step=1
-            )
-            
-            # Auto-calculate amount
-            calculated_amount = quantity_sold * selected_item_data['price_per_unit']
-            st.info(f"💡 Suggested Amount: ₹{calculated_amount:,.2f}")
-            
-            # Auto-generate description
-            description = f"Sale: {selected_item_data['item_name']} x {quantity_sold}"
+        item_entry = st.radio("Item Entry", ["📋 Choose from List", "🔖 Scan Barcode"], horizontal=True)
+        
+        if item_entry == "🔖 Scan Barcode":
+            # Empty the field after a sale (a widget's value can only be set before it is drawn)
+            if st.session_state.pop('sale_scan_done', False):
+                st.session_state['sale_scan_code'] = ""
+                st.session_state['sale_scan_count'] = st.session_state.get('sale_scan_count', 0) + 1
+            # One indexed lookup per scan; the inventory list is never loaded
+            code = st.text_input("Scan or type Barcode / SKU *", key="sale_scan_code")
+            # Keep the cursor in the field so the scanner can go straight on to the next item
+            # (the sale count changes the snippet, so it runs again after every sale)
+            st.html(f"""
+                <script>
+                // sale {st.session_state.get('sale_scan_count', 0)}
+                (function () {{
+                    const field = document.querySelector('input[aria-label="Scan or type Barcode / SKU *"]');
+                    if (field && !field.value) {{ field.focus(); }}
+                }})();
+                </script>
+            """, unsafe_allow_javascript=True)
+            if code:
+                selected_item_data = db.get_item_by_code(user_id, code)
+                if selected_item_data:
+                    st.success(f"📦 {selected_item_data['item_name']} (Stock: {selected_item_data['quantity']}, "
+                               f"Price: ₹{selected_item_data['price_per_unit']})")
+                else:
+                    st.error("No item with this barcode/SKU. Add it in Inventory Management → Update Stock.")
         else:
-            st.warning("⚠️ No inventory items available! Please add items to inventory first.")
-            st.stop()
+            st.markdown("**📦 Select Item from Inventory**")
+            inventory = db.get_inventory(user_id)
+            
+            if inventory:
+                # Create item options with stock info
+                item_options = {
+                    f"{item['item_name']} (Stock: {item['quantity']}, Price: ₹{item['price_per_unit']})": item['id'] 
+                    for item in inventory
+                }
+                
+                selected_item = st.selectbox("Select Item *", options=list(item_options.keys()))
+                
+                # Get selected item details
+                selected_item_data = next(item for item in inventory if item['id'] == item_options[selected_item])
+            else:
+                st.warning("⚠️ No inventory items available! Please add items to inventory first.")
+                st.stop()
+        
+        if selected_item_data:
+            selected_item_id = selected_item_data['id']
+            if selected_item_data['quantity'] < 1:
+                st.error("❌ This item is out of stock!")
+            else:
+                quantity_sold = st.number_input(
+                    f"Quantity (Available: {selected_item_data['quantity']})", 
+                    min_value=1, 
+                    max_value=selected_item_data['quantity'],
+                    step=1
+                )
+                
+                # Auto-calculate amount
+                calculated_amount = quantity_sold * selected_item_data['price_per_unit']
+                st.info(f"💡 Suggested Amount: ₹{calculated_amount:,.2f}")
+                
+                # Auto-generate description
+                description = f"Sale: {selected_item_data['item_name']} x {quantity_sold}"
     else:
         # For Debit transactions (payments received)
         description = st.text_area("Description", placeholder="e.g., Payment received, Advance payment")
@@ -535,6 +554,7 @@ def customer_transactions(user_id):
                     )
                     if success:
                         st.success(message)
+                        st.session_state['sale_scan_done'] = True
                         st.rerun()
                     else:
                         st.error(message)
@@ -556,18 +576,55 @@ def customer_transactions(user_id):
     
     st.markdown("---")
     
-    # View Transaction History
+    # View Transaction History (one page at a time, newest first)
     st.subheader("Transaction History")
     
-    transactions = db.get_transactions(user_id, customer_id)
+    type_filter = st.radio(
+        "Show",
+        ["All", "Credit", "Debit"],
+        horizontal=True,
+        key="history_type_filter"
+    )
+    history_type = None if type_filter == "All" else type_filter
+    
+    # Start again from the newest page when a different customer or type is selected
+    if st.session_state.get('history_key') != (customer_id, history_type):
+        st.session_state.history_key = (customer_id, history_type)
+        st.session_state.history_cursors = [None]
+    
+    page_cursors = st.session_state.history_cursors
+    transactions, next_cursor = db.get_transactions_page(
+        user_id, customer_id, after=page_cursors[-1], limit=HISTORY_PAGE_SIZE, trans_type=history_type
+    )
+    customer_balance = db.get_customer_balance(customer_id) or {}
     
     if transactions:
-        df = pd.DataFrame(transactions)
-        df = df[['id', 'type', 'amount', 'date', 'description']]
-        df.columns = ['ID', 'Type', 'Amount (₹)', 'Date', 'Description']
+        # Pager
+        first_row = (len(page_cursors) - 1) * HISTORY_PAGE_SIZE + 1
+        last_row = first_row + len(transactions) - 1
+        
+        col_newer, col_position, col_older = st.columns([1, 2, 1])
+        with col_newer:
+            if st.button("⬅️ Newer", disabled=len(page_cursors) == 1, use_container_width=True):
+                page_cursors.pop()
+                st.rerun()
+        with col_position:
+            if history_type:
+                st.caption(f"Showing {history_type.lower()} transactions {first_row}–{last_row}")
+            else:
+                total_count = customer_balance.get('txn_count', len(transactions))
+                st.caption(f"Showing {first_row}–{last_row} of {total_count} transactions")
+        with col_older:
+            if st.button("Older ➡️", disabled=next_cursor is None, use_container_width=True):
+                page_cursors.append(next_cursor)
+                st.rerun()
         
-        # Separate transactions by type for better visibility
-        st.write("**All Transactions:**")
+        # Under a type filter every row has the same Type, so that column isn't sent
+        columns = {'id': 'ID', 'type': 'Type', 'amount': 'Amount (₹)', 'date': 'Date', 'description': 'Description'}
+        if history_type:
+            del columns['type']
+        df = pd.DataFrame(transactions, columns=list(columns))
+        df.columns = list(columns.values())
         
         # Display dataframe with proper column config for theme compatibility
         st.dataframe(
@@ -583,40 +640,11 @@ def customer_transactions(user_id):
             }
         )
         
-        st.write("")
-        
-        # Show separate cards for Credit and Debit
-        col_credit, col_debit = st.columns(2)
-        
-        with col_credit:
-            credit_df = df[df['Type'] == 'Credit']
-            if not credit_df.empty:
-                st.success(f"**💰 Credit Transactions ({len(credit_df)})**")
-                st.dataframe(
-                    credit_df[['Date', 'Amount (₹)', 'Description']],
-                    use_container_width=True,
-                    hide_index=True
-                )
-            else:
-                st.info("No credit transactions")
-        
-        with col_debit:
-            debit_df = df[df['Type'] == 'Debit']
-            if not debit_df.empty:
-                st.warning(f"**💳 Debit Transactions ({len(debit_df)})**")
-                st.dataframe(
-                    debit_df[['Date', 'Amount (₹)', 'Description']],
-                    use_container_width=True,
-                    hide_index=True
-                )
-            else:
-                st.info("No debit transactions")
-        
         st.divider()
         
-        # Summary
-        total_credit = df[df['Type'] == 'Credit']['Amount (₹)'].sum()
-        total_debit = df[df['Type'] == 'Debit']['Amount (₹)'].sum()
+        # Summary (running totals for the whole history, kept by add_transaction)
+        total_credit = customer_balance.get('total_credit', 0.0)
+        total_debit = customer_balance.get('total_debit', 0.0)
         balance = total_credit - total_debit
         
         st.markdown("### Summary")
@@ -631,6 +659,8 @@ def customer_transactions(user_id):
             col3.metric("Balance", f"₹{balance:,.2f}", delta="You owe", delta_color="inverse")
         else:
             col3.metric("Balance", f"₹{balance:,.2f}", delta="Settled", delta_color="off")
+    elif history_type:
+        st.info(f"No {history_type.lower()} transactions found for this customer.")
     else:
         st.info("No transactions found for this customer.")
 
@@ -656,13 +686,18 @@ def inventory_management(user_id):
             with col2:
                 price_per_unit = st.number_input("Price per Unit (₹)", min_value=0.0, step=0.01)
             
+            sku = st.text_input("Barcode / SKU (optional)", help="Scan the item's barcode or type your own code")
+            
             submitted = st.form_submit_button("Add Item")
             
             if submitted:
                 if item_name:
-                    db.add_inventory_item(user_id, item_name, quantity, price_per_unit)
-                    st.success(f"Item '{item_name}' added successfully!")
-                    st.rerun()
+                    success, message = db.add_inventory_item(user_id, item_name, quantity, price_per_unit, sku=sku)
+                    if success:
+                        st.success(message)
+                        st.rerun()
+                    else:
+                        st.error(message)
                 else:
                     st.error("Please enter item name!")
     
@@ -685,6 +720,18 @@ def inventory_management(user_id):
                 db.update_inventory_quantity(item_id, new_quantity)
                 st.success("Stock updated successfully!")
                 st.rerun()
+            
+            # Barcode / SKU for scan-to-sale
+            current_sku = next(item['sku'] for item in inventory if item['id'] == item_id) or ""
+            new_sku = st.text_input("Barcode / SKU", value=current_sku, key=f"sku_{item_id}",
+                                    help="Leave blank to remove the code")
+            if st.button("Save Barcode"):
+                success, message = db.set_item_sku(user_id, item_id, new_sku)
+                if success:
+                    st.success(message)
+                    st.rerun()
+                else:
+                    st.error(message)
         else:
             st.info("No inventory items found. Add items in the 'Add New Item' tab.")
     
@@ -693,13 +740,12 @@ def inventory_management(user_id):
     # View Current Stock
     st.subheader("Current Stock Levels")
     
-    inventory = db.get_inventory(user_id)
+    df = db.get_inventory_frame(user_id)
     
-    if inventory:
-        df = pd.DataFrame(inventory)
+    if not df.empty:
         df['total_value'] = df['quantity'] * df['price_per_unit']
-        df = df[['id', 'item_name', 'quantity', 'price_per_unit', 'total_value']]
-        df.columns = ['ID', 'Item Name', 'Quantity', 'Price/Unit (₹)', 'Total Value (₹)']
+        df = df[['id', 'item_name', 'sku', 'quantity', 'price_per_unit', 'total_value']]
+        df.columns = ['ID', 'Item Name', 'Barcode/SKU', 'Quantity', 'Price/Unit (₹)', 'Total Value (₹)']
         
         # Display with proper column config for theme compatibility
         st.dataframe(
@@ -709,6 +755,7 @@ def inventory_management(user_id):
             column_config={
                 "ID": st.column_config.NumberColumn("ID", width="small"),
                 "Item Name": st.column_config.TextColumn("Item Name", width="medium"),
+                "Barcode/SKU": st.column_config.TextColumn("Barcode/SKU", width="small"),
                 "Quantity": st.column_config.NumberColumn("Quantity", width="small"),
                 "Price/Unit (₹)": st.column_config.NumberColumn("Price/Unit (₹)", format="₹%.2f", width="medium"),
                 "Total Value (₹)": st.column_config.NumberColumn("Total Value (₹)", format="₹%.2f", width="medium")
@@ -804,17 +851,15 @@ def supplier_management(user_id):
                         st.info(f"💵 Total Amount: ₹{total_amount:,.2f}")
                         
                         if st.button("Record Stock Purchase", type="primary"):
-                            # Update inventory
-                            new_quantity = selected_item['quantity'] + quantity_purchased
-                            db.update_inventory_quantity(selected_item_id, new_quantity)
-                            
-                            # Update supplier due
-                            db.update_supplier_due(supplier_id, total_amount)
-                            
-                            st.success(f"✅ Stock purchase recorded!")
-                            st.success(f"📦 Inventory updated: {selected_item['item_name']} +{quantity_purchased} units")
-                            st.success(f"💰 Supplier due increased by ₹{total_amount:,.2f}")
-                            st.rerun()
+                            # Stock and supplier due are updated together
+                            success, message = db.record_supplier_purchase(
+                                user_id, supplier_id, selected_item_id, quantity_purchased, price_per_unit
+                            )
+                            if success:
+                                st.success(f"✅ Stock purchase recorded: {message}")
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {message}")
                     
                     else:  # Add New Item
                         st.markdown("**Add New Inventory Item**")
@@ -831,15 +876,15 @@ def supplier_management(user_id):
                         
                         if st.button("Add Item & Record Purchase", type="primary"):
                             if new_item_name:
-                                # Add new inventory item
-                                db.add_inventory_item(user_id, new_item_name, quantity_purchased, price_per_unit)
-                                
-                                # Update supplier due
-                                db.update_supplier_due(supplier_id, total_amount)
-                                
-                                st.success(f"✅ New item '{new_item_name}' added to inventory!")
-                                st.success(f"💰 Supplier due increased by ₹{total_amount:,.2f}")
-                                st.rerun()
+                                # New inventory item and supplier due are saved together
+                                success, message = db.record_supplier_purchase(
+                                    user_id, supplier_id, new_item_name, quantity_purchased, price_per_unit
+                                )
+                                if success:
+                                    st.success(f"✅ New item '{new_item_name}' added to inventory!")
+                                    st.rerun()
+                                else:
+                                    st.error(f"❌ {message}")
                             else:
                                 st.error("Please enter item name!")
                 else:
@@ -857,10 +902,14 @@ def supplier_management(user_id):
                     
                     if st.button("Add Item & Record Purchase", type="primary"):
                         if new_item_name:
-                            db.add_inventory_item(user_id, new_item_name, quantity_purchased, price_per_unit)
-                            db.update_supplier_due(supplier_id, total_amount)
-                            st.success("✅ Item added and purchase recorded!")
-                            st.rerun()
+                            success, message = db.record_supplier_purchase(
+                                user_id, supplier_id, new_item_name, quantity_purchased, price_per_unit
+                            )
+                            if success:
+                                st.success("✅ Item added and purchase recorded!")
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {message}")
                         else:
                             st.error("Please enter item name!")
             
@@ -882,10 +931,9 @@ def supplier_management(user_id):
     # View Suppliers
     st.subheader("Supplier List")
     
-    suppliers = db.get_suppliers(user_id)
+    df = db.get_suppliers_frame(user_id)
     
-    if suppliers:
-        df = pd.DataFrame(suppliers)
+    if not df.empty:
         df['balance'] = df['amount_due'] - df['amount_paid']
         df = df[['id', 'supplier_name', 'contact', 'amount_due', 'amount_paid', 'balance']]
         df.columns = ['ID', 'Supplier Name', 'Contact', 'Amount Due (₹)', 'Amount Paid (₹)', 'Balance (₹)']
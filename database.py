@@ -1,83 +1,264 @@
+import os
 import sqlite3
+import tempfile
+import threading
+import queue
+import weakref
+import time
+import random
+import functools
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+DATABASE_NAME = "Vyapar_Digikhata.db"
 
 # --- CONNECTION ---
-def get_connection():
-    conn = sqlite3.connect("Vyapar_Digikhata.db")
+
+# Settings applied once when a connection is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Each thread keeps one open connection. Streamlit runs reruns on short-lived
+# script threads, so when a thread exits its connection is parked here and
+# handed to the next thread instead of being closed.
+_local = threading.local()
+_idle_connections = queue.SimpleQueue()
+_stats_lock = threading.Lock()
+_connect_count = 0
+
+def _open_connection():
+    global _connect_count
+    conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    with _stats_lock:
+        _connect_count += 1
     return conn
 
-def create_table():
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Users Table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        owner_name TEXT,
-        email TEXT,
-        shop_name TEXT,
-        password TEXT
-    )
-    """)
-    
-    # Customers Table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS customers(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        name TEXT,
-        contact TEXT UNIQUE,
-        address TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-    
-    # Inventory Table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS inventory(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        item_name TEXT,
-        quantity INTEGER,
-        price_per_unit REAL,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-    
-    # Transactions Table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS transactions(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        customer_id INTEGER,
-        type TEXT,
-        amount REAL,
-        date TEXT,
-        description TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id),
-        FOREIGN KEY(customer_id) REFERENCES customers(id)
-    )
-    """)
+def _release_connection(conn):
+    """Return a connection to the idle pool once its thread has finished"""
+    if conn.in_transaction:
+        conn.rollback()
+    _idle_connections.put(conn)
 
-    # Suppliers Table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS suppliers(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        supplier_name TEXT,
-        contact TEXT,
-        amount_due REAL,
-        amount_paid REAL,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-    
-    conn.commit()
-    conn.close()
+class _ConnectionSlot:
+    """Thread-local holder; gives the connection back to the pool when the thread exits"""
+    def __init__(self, conn):
+        self.conn = conn
+        weakref.finalize(self, _release_connection, conn)
+
+def get_connection():
+    """Get this thread's pooled connection (do not close it)"""
+    slot = getattr(_local, 'slot', None)
+    if slot is None:
+        try:
+            conn = _idle_connections.get_nowait()
+        except queue.Empty:
+            conn = _open_connection()
+        slot = _ConnectionSlot(conn)
+        _local.slot = slot
+    return slot.conn
+
+@contextmanager
+def scratch_copy():
+    """
+    Point this thread at a throwaway copy of the database until the block exits
+    For diagnostics that call read paths which may write (the alert rollover)
+    """
+    live = get_connection()
+    slot = _local.slot
+    with tempfile.TemporaryDirectory() as directory:
+        copy = sqlite3.connect(os.path.join(directory, DATABASE_NAME), check_same_thread=False)
+        live.backup(copy)
+        copy.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            copy.execute(pragma)
+        clear_cache()
+        slot.conn = copy
+        try:
+            yield copy
+        finally:
+            slot.conn = live
+            copy.close()
+            clear_cache()
+
+def get_connection_stats():
+    """Connection counters for benchmarks and diagnostics"""
+    return {
+        'connects': _connect_count,
+        'idle': _idle_connections.qsize()
+    }
+
+# --- SCHEMA ---
 
-# Initialize tables immediately
-create_table()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def init_db():
+    """Apply pending schema migrations (runs once per process)"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            from migrations import migrate
+            migrate(get_connection())
+            _schema_ready = True
+
+# --- DATE HELPERS ---
+
+# Transactions store their date as text for display plus date_day, the
+# number of days since EPOCH, which is what filters and indexes use.
+EPOCH = date(1970, 1, 1)
+
+def to_day(value):
+    """Convert a date, datetime or 'YYYY-MM-DD' string to an epoch-day number"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+def from_day(day):
+    """Convert an epoch-day number back to a date"""
+    return EPOCH + timedelta(days=day)
+
+def today_day():
+    return to_day(date.today())
+
+# --- READ CACHE ---
+
+# Every Streamlit rerun repeats the same reads. Results are cached per shop
+# and keyed by (user_id, query, args). Each shop has a generation counter
+# that its write functions bump after they commit; an entry made under an
+# older generation is a miss. Writes that aren't tied to one shop (by item
+# or supplier id) bump the shared generation, which expires every shop.
+# Only writes made through this module are seen - after writing to the
+# database from another process (add_test_data.py, migrations.py) call
+# clear_cache() or restart the app.
+CACHE_MAX_ENTRIES = 256  # 0 turns the cache off
+# Every hit copies the result, so the cache is also bounded by rows held:
+# results larger than CACHE_MAX_RESULT_ROWS (whole-shop transaction lists,
+# export frames) are never stored, and the total is kept under CACHE_MAX_ROWS
+CACHE_MAX_RESULT_ROWS = 2000
+CACHE_MAX_ROWS = 20000
+
+_cache = OrderedDict()  # key -> (generation token, result, rows), oldest first
+_cache_lock = threading.Lock()
+_cache_rows = 0
+_user_generations = {}
+_shared_generation = 0
+_write_generation = 0  # bumped by every write; used by reads not keyed by shop
+_cache_counts = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def _cache_token(user_id):
+    if user_id is None:
+        return (_write_generation,)
+    return (_shared_generation, _user_generations.get(user_id, 0))
+
+def _result_rows(value):
+    """Size of a result in rows (lists and DataFrames), the unit the cache is bounded by"""
+    if isinstance(value, tuple):
+        return sum(_result_rows(item) for item in value)
+    if isinstance(value, list) or hasattr(value, 'columns'):  # list or DataFrame
+        return max(len(value), 1)
+    return 1
+
+def _copy_result(value):
+    """Callers may modify what they get back, so hand out copies"""
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_copy_result(item) for item in value)
+    if isinstance(value, dict):
+        return dict(value)
+    if hasattr(value, 'copy'):  # DataFrame
+        return value.copy()
+    return value
+
+def _cached_read(per_user=True):
+    """Cache a read function; its first argument is the user_id unless per_user is False"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            global _cache_rows
+            if CACHE_MAX_ENTRIES <= 0:
+                return func(*args, **kwargs)
+            user_id = (args[0] if args else kwargs.get('user_id')) if per_user else None
+            key = (user_id, func.__name__, args, tuple(sorted(kwargs.items())))
+            
+            with _cache_lock:
+                # Taken before the query runs, so a write that commits while
+                # we're reading leaves this entry already out of date
+                token = _cache_token(user_id)
+                entry = _cache.get(key)
+                if entry is not None and entry[0] == token:
+                    _cache.move_to_end(key)
+                    _cache_counts['hits'] += 1
+                    return _copy_result(entry[1])
+                _cache_counts['misses'] += 1
+            
+            result = func(*args, **kwargs)
+            rows = _result_rows(result)
+            if rows > CACHE_MAX_RESULT_ROWS:
+                return result  # too big to keep; the caller gets the only copy
+
+            with _cache_lock:
+                old = _cache.pop(key, None)
+                if old is not None:
+                    _cache_rows -= old[2]
+                _cache[key] = (token, result, rows)
+                _cache_rows += rows
+                while len(_cache) > CACHE_MAX_ENTRIES or _cache_rows > CACHE_MAX_ROWS:
+                    _cache_rows -= _cache.popitem(last=False)[1][2]
+                    _cache_counts['evictions'] += 1
+            return _copy_result(result)
+        return wrapper
+    return decorator
+
+def invalidate_cache(user_id=None):
+    """Expire cached reads for one shop, or for every shop if user_id is None"""
+    global _shared_generation, _write_generation
+    with _cache_lock:
+        _write_generation += 1
+        if user_id is None:
+            _shared_generation += 1
+        else:
+            _user_generations[user_id] = _user_generations.get(user_id, 0) + 1
+
+def _invalidates_cache(per_user=True):
+    """Bump the generation after a write function returns (whether or not it wrote)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                user_id = (args[0] if args else kwargs.get('user_id')) if per_user else None
+                invalidate_cache(user_id)
+        return wrapper
+    return decorator
+
+def clear_cache():
+    """Drop every cached read"""
+    global _cache_rows
+    invalidate_cache()
+    with _cache_lock:
+        _cache.clear()
+        _cache_rows = 0
+
+def get_cache_stats():
+    """Read cache counters for benchmarks and diagnostics"""
+    with _cache_lock:
+        return dict(_cache_counts, entries=len(_cache), rows=_cache_rows)
 
 # --- VALIDATION FUNCTIONS ---
 
@@ -105,19 +286,17 @@ def validate_phone(phone):
 # --- USER FUNCTIONS ---
 
 def insert_user(name, email, shop_name, password):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO users(owner_name,email,shop_name,password) VALUES(?,?,?,?)", 
-                   (name, email, shop_name, password))
-    conn.commit()
-    conn.close()
+    def write(cursor):
+        cursor.execute("INSERT INTO users(owner_name,email,shop_name,password) VALUES(?,?,?,?)",
+                       (name, email, shop_name, password))
+    
+    _run_write(write)
 
 def get_users(email):
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users where email=?", (email,))
     data = cursor.fetchall()
-    conn.close()
     return data
 
 def chek_pass(p):
@@ -125,7 +304,6 @@ def chek_pass(p):
     cursor = conn.cursor()
     cursor.execute("SELECT password FROM users WHERE password = ?", (p,))
     data = cursor.fetchone()
-    conn.close()
     return True if data else False
 
 # --- CUSTOMER FUNCTIONS ---
@@ -136,195 +314,472 @@ def check_contact_exists(contact):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM customers WHERE contact=?", (contact,))
     result = cursor.fetchone()
-    conn.close()
     return result is not None
 
+@_invalidates_cache()
 def add_customer(user_id, name, contact, address):
     """Add customer with unique contact validation"""
     # First check if contact already exists (for all users, not just current user)
     if check_contact_exists(contact):
         return False, "❌ This contact number is already registered with another customer!"
     
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO customers(user_id, name, contact, address) VALUES(?,?,?,?)", 
+    def write(cursor):
+        cursor.execute("INSERT INTO customers(user_id, name, contact, address) VALUES(?,?,?,?)",
                        (user_id, name, contact, address))
-        conn.commit()
-        conn.close()
+    
+    try:
+        _run_write(write)
         return True, "✅ Customer added successfully!"
     except sqlite3.IntegrityError:
         return False, "❌ This contact number is already registered!"
 
+@_cached_read()
 def get_customers(user_id):
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM customers WHERE user_id=?", (user_id,))
     customers = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return customers
 
+_fts_available = None
+
+def _has_customer_fts(cursor):
+    global _fts_available
+    if _fts_available is None:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name='customers_fts'")
+        _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+def _fts_prefix_query(query):
+    """'ram 98' -> '"ram"* AND "98"*' (every word must start a word in name or contact)"""
+    # Word characters as the unicode61 tokenizer sees them: letters, digits and
+    # combining marks, so Devanagari vowel signs (matras) stay inside their word
+    words = "".join(ch if unicodedata.category(ch)[0] in "LNM" else " " for ch in query).split()
+    return " AND ".join(f'"{word}"*' for word in words)
+
+@_cached_read()
+def search_customers(user_id, query="", limit=20):
+    """
+    Find a shop's customers whose name or contact starts with the typed words
+    An empty query returns the first customers alphabetically.
+    Returns: list of customer dicts, best matches first, at most limit
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    match = _fts_prefix_query(query or "")
+    
+    if not match:
+        cursor.execute("SELECT * FROM customers WHERE user_id=? ORDER BY name COLLATE NOCASE LIMIT ?",
+                       (user_id, limit))
+    elif _has_customer_fts(cursor):
+        cursor.execute("""
+            SELECT c.*
+            FROM customers_fts f
+            JOIN customers c ON c.id = f.rowid
+            WHERE customers_fts MATCH ?
+            ORDER BY f.rank, c.name COLLATE NOCASE
+            LIMIT ?
+        """, (f"shop:u{int(user_id)} AND {{name contact}}: ({match})", limit))
+    else:
+        pattern = (query.strip().replace("%", "").replace("_", "")) + "%"
+        cursor.execute("""
+            SELECT * FROM customers
+            WHERE user_id=? AND (name LIKE ? OR name LIKE ? OR contact LIKE ?)
+            ORDER BY name COLLATE NOCASE LIMIT ?
+        """, (user_id, pattern, "% " + pattern, pattern, limit))
+    return [dict(row) for row in cursor.fetchall()]
+
+@_cached_read(per_user=False)
 def get_customer_by_id(customer_id):
     """Get a specific customer by ID"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM customers WHERE id = ?", (customer_id,))
     customer = cursor.fetchone()
-    conn.close()
     return dict(customer) if customer else None
 
 # --- INVENTORY FUNCTIONS ---
 
-def add_inventory_item(user_id, item_name, quantity, price, cost_price=0.0):
-    """Add inventory item with cost price for profit margin"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if cost_price column exists, if not add it
-    cursor.execute("PRAGMA table_info(inventory)")
-    columns = [column[1] for column in cursor.fetchall()]
+def _clean_sku(sku):
+    """Barcodes are stored trimmed; blank means no code"""
+    sku = (sku or "").strip()
+    return sku or None
+
+@_invalidates_cache()
+def add_inventory_item(user_id, item_name, quantity, price, cost_price=0.0, sku=None):
+    """Add inventory item with cost price for profit margin and an optional barcode/SKU"""
+    def write(cursor):
+        cursor.execute("INSERT INTO inventory(user_id, item_name, quantity, price_per_unit, cost_price, sku) VALUES(?,?,?,?,?,?)",
+                       (user_id, item_name, quantity, price, cost_price, _clean_sku(sku)))
+        _sync_low_stock_alerts(cursor, [cursor.lastrowid])
     
-    if 'cost_price' not in columns:
-        cursor.execute("ALTER TABLE inventory ADD COLUMN cost_price REAL DEFAULT 0.0")
+    try:
+        _run_write(write)
+        return True, f"Item '{item_name}' added successfully!"
+    except sqlite3.IntegrityError:
+        return False, "❌ This barcode/SKU is already used by another item!"
+
+@_invalidates_cache()
+def set_item_sku(user_id, item_id, sku):
+    """Set or clear (blank sku) an item's barcode/SKU"""
+    def write(cursor):
+        cursor.execute("UPDATE inventory SET sku=? WHERE id=? AND user_id=?", (_clean_sku(sku), item_id, user_id))
+        return cursor.rowcount
     
-    cursor.execute("INSERT INTO inventory(user_id, item_name, quantity, price_per_unit, cost_price) VALUES(?,?,?,?,?)", 
-                   (user_id, item_name, quantity, price, cost_price))
-    conn.commit()
-    conn.close()
+    try:
+        if _run_write(write) == 0:
+            return False, "Item not found!"
+        return True, "✅ Barcode/SKU saved!"
+    except sqlite3.IntegrityError:
+        return False, "❌ This barcode/SKU is already used by another item!"
+
+@_cached_read()
+def get_item_by_code(user_id, code):
+    """Look up an inventory item by its barcode/SKU (None if no item has it)"""
+    code = _clean_sku(code)
+    if code is None:
+        return None
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM inventory WHERE user_id=? AND sku=?", (user_id, code))
+    item = cursor.fetchone()
+    return dict(item) if item else None
 
+@_cached_read()
 def get_inventory(user_id):
     conn = get_connection()
     cursor = conn.cursor()
-    
-    # Check if cost_price column exists
-    cursor.execute("PRAGMA table_info(inventory)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'cost_price' not in columns:
-        cursor.execute("ALTER TABLE inventory ADD COLUMN cost_price REAL DEFAULT 0.0")
-        conn.commit()
-    
     cursor.execute("SELECT * FROM inventory WHERE user_id=?", (user_id,))
     items = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return items
 
+@_invalidates_cache(per_user=False)
 def update_inventory_quantity(item_id, new_quantity):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE inventory SET quantity=? WHERE id=?", (new_quantity, item_id))
-    conn.commit()
-    conn.close()
+    def write(cursor):
+        cursor.execute("UPDATE inventory SET quantity=? WHERE id=?", (new_quantity, item_id))
+        _sync_low_stock_alerts(cursor, [item_id])
+    
+    _run_write(write)
 
+@_cached_read()
 def get_total_inventory_value(user_id):
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT SUM(quantity * price_per_unit) FROM inventory WHERE user_id=?", (user_id,))
     result = cursor.fetchone()[0]
-    conn.close()
     return result if result else 0.0
 
+# --- WRITE HELPER ---
+
+# Writes take the write lock up front with BEGIN IMMEDIATE, so they never
+# fail half-way through with "database is locked". If the lock isn't free
+# within busy_timeout the whole write is retried with exponential backoff.
+WRITE_RETRIES = 5
+WRITE_BACKOFF_SECONDS = 0.05
+
+def _is_busy(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+def _run_write(work):
+    """
+    Run work(cursor) in its own write transaction and commit it
+    Returns: whatever work returns
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    for attempt in range(WRITE_RETRIES):
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            result = work(cursor)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(e) or attempt == WRITE_RETRIES - 1:
+                raise
+            time.sleep(WRITE_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+def run_write(work):
+    """Run work(cursor) as one retried write transaction (for modules outside this one)"""
+    return _run_write(work)
+
 # --- TRANSACTION FUNCTIONS ---
 
+@_invalidates_cache()
 def add_transaction(user_id, customer_id, trans_type, amount, date, description, item_id=None, quantity=None):
     """Add transaction and update inventory if item is purchased"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    is_sale = trans_type == "Credit" and item_id and quantity
     
-    try:
+    def write(cursor):
+        # If item is purchased (Credit transaction with item), reduce inventory.
+        # Check and decrement are a single statement, so two cashiers selling
+        # the last unit at the same time can't both succeed.
+        if is_sale:
+            cursor.execute("UPDATE inventory SET quantity = quantity - ? WHERE id=? AND quantity >= ?",
+                           (quantity, item_id, quantity))
+            if cursor.rowcount == 0:
+                return False, "Insufficient stock! Transaction cancelled."
+        
         # Insert transaction
-        cursor.execute("INSERT INTO transactions(user_id, customer_id, type, amount, date, description) VALUES(?,?,?,?,?,?)", 
-                       (user_id, customer_id, trans_type, amount, date, description))
+        cursor.execute("INSERT INTO transactions(user_id, customer_id, type, amount, date, date_day, description) VALUES(?,?,?,?,?,?,?)", 
+                       (user_id, customer_id, trans_type, amount, date_text, date_day, description))
         
-        # If item is purchased (Credit transaction with item), reduce inventory
-        if trans_type == "Credit" and item_id and quantity:
-            # Check current stock
-            cursor.execute("SELECT quantity FROM inventory WHERE id=?", (item_id,))
-            current_stock = cursor.fetchone()
-            
-            if current_stock and current_stock[0] >= quantity:
-                # Update inventory
-                cursor.execute("UPDATE inventory SET quantity = quantity - ? WHERE id=?", (quantity, item_id))
-                conn.commit()
-                conn.close()
-                return True, "Transaction added and inventory updated!"
-            else:
-                conn.rollback()
-                conn.close()
-                return False, "Insufficient stock! Transaction cancelled."
+        # Keep the customer's running balance and the day's totals in the same DB transaction
+        _apply_balance_change(cursor, user_id, customer_id, trans_type, amount, date_day)
+        _apply_daily_change(cursor, user_id, trans_type, amount, date_day)
         
-        conn.commit()
-        conn.close()
-        return True, "Transaction added successfully!"
+        # ...and the notifications they affect
+        if is_sale:
+            _sync_low_stock_alerts(cursor, [item_id])
+        _sync_overdue_alerts(cursor, [customer_id])
         
+        if is_sale:
+            return True, "Transaction added and inventory updated!"
+        return True, "Transaction added successfully!"
+    
+    try:
+        date_day = to_day(date)
+        date_text = from_day(date_day).strftime('%Y-%m-%d')
+        return _run_write(write)
     except Exception as e:
-        conn.rollback()
-        conn.close()
         return False, f"Error: {str(e)}"
 
+@_invalidates_cache()
+def add_transactions_bulk(user_id, rows):
+    """
+    Add many transactions in one DB transaction (e.g. a day's khata or a POS export)
+    rows: list of dicts with customer_id, type, amount, date, description
+          and optionally item_id/quantity for sales
+    Returns: list of (success, message), one per row, in input order
+    
+    Stock is checked for all sales together: rows are taken in order and a
+    sale is rejected once earlier rows in the batch have used up the item.
+    """
+    results = [None] * len(rows)
+    accepted = []
+    days = {}  # date value -> (date_day, 'YYYY-MM-DD'); batches repeat a few dates
+    
+    # Validate rows that don't need the database
+    for index, row in enumerate(rows):
+        if row.get('type') not in ("Credit", "Debit"):
+            results[index] = (False, "Error: type must be 'Credit' or 'Debit'")
+            continue
+        try:
+            day = days.get(row['date'])
+            if day is None:
+                date_day = to_day(row['date'])
+                day = days[row['date']] = (date_day, from_day(date_day).strftime('%Y-%m-%d'))
+        except (KeyError, TypeError, ValueError):
+            results[index] = (False, "Error: invalid date")
+            continue
+        amount = row.get('amount')
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not amount > 0:
+            results[index] = (False, "Error: amount must be a positive number")
+            continue
+        if row.get('customer_id') is None:
+            results[index] = (False, "Error: customer_id is required")
+            continue
+        quantity = row.get('quantity')
+        if row.get('item_id') and quantity and (isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 0):
+            results[index] = (False, "Error: quantity must be a whole number")
+            continue
+        accepted.append((index, row, day))
+    
+    # Every customer must belong to this shop
+    customer_ids = list({row['customer_id'] for _, row, _ in accepted})
+    own_customers = set()
+    conn = get_connection()
+    for start in range(0, len(customer_ids), 500):
+        chunk = customer_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        own_customers.update(row[0] for row in conn.execute(
+            f"SELECT id FROM customers WHERE user_id=? AND id IN ({placeholders})", (user_id, *chunk)))
+    for index, row, _ in accepted:
+        if row['customer_id'] not in own_customers:
+            results[index] = (False, "Error: customer not found")
+    accepted = [entry for entry in accepted if results[entry[0]] is None]
+    
+    sales = [(index, row) for index, row, _ in accepted
+             if row['type'] == "Credit" and row.get('item_id') and row.get('quantity')]
+    
+    def write(cursor):
+        batch_results = list(results)
+        
+        # Current stock for every item sold in the batch (the write lock is
+        # already held, so it can't change before we decrement it)
+        stock = {}
+        item_ids = list({row['item_id'] for _, row in sales})
+        for start in range(0, len(item_ids), 500):
+            chunk = item_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f"SELECT id, quantity FROM inventory WHERE user_id=? AND id IN ({placeholders})",
+                           (user_id, *chunk))
+            stock.update({row[0]: row[1] for row in cursor.fetchall()})
+        
+        # Allocate stock to sales in input order
+        decrements = {}
+        for index, row in sales:
+            item_id, quantity = row['item_id'], row['quantity']
+            if item_id not in stock:
+                batch_results[index] = (False, "Item not found! Transaction cancelled.")
+            elif stock[item_id] >= quantity:
+                stock[item_id] -= quantity
+                decrements[item_id] = decrements.get(item_id, 0) + quantity
+            else:
+                batch_results[index] = (False, "Insufficient stock! Transaction cancelled.")
+        
+        # Write everything that passed validation
+        inserts = []
+        balance_changes = {}
+        daily_changes = {}
+        for index, row, (date_day, date_text) in accepted:
+            if batch_results[index] is not None:
+                continue
+            customer_id, amount = row['customer_id'], row['amount']
+            inserts.append((user_id, customer_id, row['type'], amount,
+                            date_text, date_day, row.get('description', '')))
+            
+            change = balance_changes.setdefault(customer_id, [user_id, 0, 0, date_day, 0])
+            change[1 if row['type'] == "Credit" else 2] += amount
+            change[3] = max(change[3], date_day)
+            change[4] += 1
+            
+            day_change = daily_changes.setdefault(date_day, [0, 0, 0])
+            day_change[0 if row['type'] == "Credit" else 1] += amount
+            day_change[2] += 1
+            
+            if row['type'] == "Credit" and row.get('item_id') and row.get('quantity'):
+                batch_results[index] = (True, "Transaction added and inventory updated!")
+            else:
+                batch_results[index] = (True, "Transaction added successfully!")
+        
+        cursor.executemany("INSERT INTO transactions(user_id, customer_id, type, amount, date, date_day, description) VALUES(?,?,?,?,?,?,?)",
+                           inserts)
+        cursor.executemany("UPDATE inventory SET quantity = quantity - ? WHERE id=?",
+                           [(quantity, item_id) for item_id, quantity in decrements.items()])
+        _apply_balance_changes(cursor, balance_changes)
+        _apply_daily_changes(cursor, user_id, daily_changes)
+        _sync_low_stock_alerts(cursor, decrements)
+        _sync_overdue_alerts(cursor, balance_changes)
+        return batch_results
+    
+    try:
+        return _run_write(write)
+    except Exception as e:
+        error = (False, f"Error: {str(e)}")
+        return [result if result and not result[0] else error for result in results]
+
+@_cached_read()
 def get_transactions(user_id, customer_id=None):
     conn = get_connection()
     cursor = conn.cursor()
     if customer_id:
-        cursor.execute("SELECT * FROM transactions WHERE user_id=? AND customer_id=? ORDER BY date DESC", (user_id, customer_id))
+        cursor.execute("SELECT * FROM transactions WHERE user_id=? AND customer_id=? ORDER BY date_day DESC, id DESC", (user_id, customer_id))
     else:
-        cursor.execute("SELECT * FROM transactions WHERE user_id=? ORDER BY date DESC", (user_id,))
+        cursor.execute("SELECT * FROM transactions WHERE user_id=? ORDER BY date_day DESC, id DESC", (user_id,))
     transactions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return transactions
 
+@_cached_read()
 def get_transactions_filtered(user_id, start_date, end_date, customer_id=None):
-    """Get transactions within a date range"""
+    """Get transactions between two dates (inclusive); dates may be date objects or 'YYYY-MM-DD'"""
     conn = get_connection()
     cursor = conn.cursor()
+    start_day, end_day = to_day(start_date), to_day(end_date)
     if customer_id:
         cursor.execute(
-            "SELECT * FROM transactions WHERE user_id=? AND customer_id=? AND date BETWEEN ? AND ? ORDER BY date DESC",
-            (user_id, customer_id, start_date, end_date)
+            "SELECT * FROM transactions WHERE user_id=? AND customer_id=? AND date_day BETWEEN ? AND ? ORDER BY date_day DESC, id DESC",
+            (user_id, customer_id, start_day, end_day)
         )
     else:
         cursor.execute(
-            "SELECT * FROM transactions WHERE user_id=? AND date BETWEEN ? AND ? ORDER BY date DESC",
-            (user_id, start_date, end_date)
+            "SELECT * FROM transactions WHERE user_id=? AND date_day BETWEEN ? AND ? ORDER BY date_day DESC, id DESC",
+            (user_id, start_day, end_day)
         )
     transactions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return transactions
 
-def get_net_balance(user_id):
+@_cached_read()
+def get_transactions_page(user_id, customer_id, after=None, limit=50, trans_type=None):
+    """
+    Get one page of a customer's history, newest first
+    after: cursor returned for the previous page, or None for the first page
+    trans_type: 'Credit' or 'Debit' to page through one type only (None = both)
+    Returns: (transactions, next_cursor) - next_cursor is None on the last page
+    """
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT type, SUM(amount) FROM transactions WHERE user_id=? GROUP BY type", (user_id,))
-    rows = cursor.fetchall()
-    
-    credits = 0
-    debits = 0
-    for row in rows:
-        if row['type'] == 'Credit':
-            credits = row[1]
-        elif row['type'] == 'Debit':
-            debits = row[1]
-            
-    conn.close()
-    return credits - debits
+    where = "user_id=? AND customer_id=?"
+    params = [user_id, customer_id]
+    if trans_type:
+        where += " AND type=?"
+        params.append(trans_type)
+    if after:
+        # Keyset pagination: continue strictly below the last (date_day, id) shown
+        after_day, after_id = after
+        if not isinstance(after_day, int):
+            after_day = to_day(after_day)
+        where += " AND (date_day, id) < (?, ?)"
+        params += [after_day, after_id]
+    cursor.execute(
+        f"SELECT id, type, amount, date, description, date_day FROM transactions WHERE {where} ORDER BY date_day DESC, id DESC LIMIT ?",
+        params + [limit + 1]
+    )
+    transactions = [dict(row) for row in cursor.fetchall()]
+    
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        last = transactions[-1]
+        next_cursor = (last['date_day'], last['id'])
+    return transactions, next_cursor
 
+def get_net_balance(user_id):
+    income, expense = get_income_expense(user_id)
+    return income - expense
+
+@_cached_read()
 def get_income_expense(user_id):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT type, SUM(amount) FROM transactions WHERE user_id=? GROUP BY type", (user_id,))
-    rows = cursor.fetchall()
-    
-    income = 0
-    expense = 0
-    for row in rows:
-        if row['type'] == 'Credit':
-            income = row[1]
-        elif row['type'] == 'Debit':
-            expense = row[1]
-            
-    conn.close()
+    cursor.execute("SELECT SUM(total_credit), SUM(total_debit) FROM customer_balances WHERE user_id=?", (user_id,))
+    row = cursor.fetchone()
+    
+    income = row[0] or 0
+    expense = row[1] or 0
     return income, expense
 
+def _day_range_clause(start_date, end_date, column="date_day"):
+    if start_date and end_date:
+        return f" AND {column} BETWEEN ? AND ?", [to_day(start_date), to_day(end_date)]
+    return "", []
+
+@_cached_read()
+def get_period_totals(user_id, start_date=None, end_date=None):
+    """
+    Total credit, debit and transaction count between two dates (all time when no dates are given)
+    Returns: dict with credit, debit, txn_count
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    if start_date and end_date:
+        day_filter, params = _day_range_clause(start_date, end_date, "day")
+        cursor.execute(f"SELECT SUM(credit), SUM(debit), SUM(txn_count) FROM daily_summary WHERE user_id=?{day_filter}",
+                       (user_id, *params))
+    else:
+        # All time is already summed per customer
+        cursor.execute("SELECT SUM(total_credit), SUM(total_debit), SUM(txn_count) FROM customer_balances WHERE user_id=?",
+                       (user_id,))
+    credit, debit, txn_count = cursor.fetchone()
+    return {'credit': credit or 0, 'debit': debit or 0, 'txn_count': txn_count or 0}
+
+@_cached_read()
 def get_customer_profit_comparison(user_id):
     """Get profit/loss for each customer"""
     conn = get_connection()
@@ -333,49 +788,602 @@ def get_customer_profit_comparison(user_id):
         SELECT 
             c.name,
             c.id,
-            SUM(CASE WHEN t.type = 'Credit' THEN t.amount ELSE 0 END) as total_credit,
-            SUM(CASE WHEN t.type = 'Debit' THEN t.amount ELSE 0 END) as total_debit,
-            SUM(CASE WHEN t.type = 'Credit' THEN t.amount ELSE -t.amount END) as net_profit
-        FROM customers c
-        LEFT JOIN transactions t ON c.id = t.customer_id
-        WHERE c.user_id = ?
-        GROUP BY c.id, c.name
-        HAVING (total_credit > 0 OR total_debit > 0)
+            b.total_credit,
+            b.total_debit,
+            b.total_credit - b.total_debit as net_profit
+        FROM customer_balances b
+        JOIN customers c ON c.id = b.customer_id
+        WHERE b.user_id = ?
+        AND (b.total_credit > 0 OR b.total_debit > 0)
         ORDER BY net_profit DESC
     """, (user_id,))
     
     results = cursor.fetchall()
-    conn.close()
     return [dict(row) for row in results]
 
-# --- SUPPLIER FUNCTIONS ---
+# --- CUSTOMER BALANCE FUNCTIONS ---
 
-def add_supplier(user_id, name, contact, due, paid):
+# customer_balances holds per-customer totals so balance and overdue lookups
+# cost O(customers) instead of re-reading every transaction. add_transaction
+# keeps it current; rebuild_customer_balances recomputes it from scratch.
+
+_BALANCE_UPSERT = """
+    INSERT INTO customer_balances(customer_id, user_id, total_credit, total_debit, last_txn_day, txn_count)
+    VALUES(?,?,?,?,?,?)
+    ON CONFLICT(customer_id) DO UPDATE SET
+        total_credit = total_credit + excluded.total_credit,
+        total_debit = total_debit + excluded.total_debit,
+        last_txn_day = MAX(COALESCE(last_txn_day, excluded.last_txn_day), excluded.last_txn_day),
+        txn_count = txn_count + excluded.txn_count
+"""
+
+def _apply_balance_change(cursor, user_id, customer_id, trans_type, amount, date_day):
+    credit = amount if trans_type == 'Credit' else 0
+    debit = amount if trans_type == 'Debit' else 0
+    cursor.execute(_BALANCE_UPSERT, (customer_id, user_id, credit, debit, date_day, 1))
+
+def _apply_balance_changes(cursor, changes):
+    """changes: {customer_id: [user_id, credit, debit, last_day, count]}"""
+    cursor.executemany(_BALANCE_UPSERT, [
+        (customer_id, user_id, credit, debit, last_day, count)
+        for customer_id, (user_id, credit, debit, last_day, count) in changes.items()
+    ])
+
+@_cached_read()
+def get_customer_balances(user_id):
+    """Get running totals for every customer of a shop that has transactions"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT 
+            c.id as customer_id,
+            c.name as customer_name,
+            c.contact as customer_phone,
+            b.total_credit,
+            b.total_debit,
+            b.last_txn_day,
+            b.txn_count
+        FROM customer_balances b
+        JOIN customers c ON c.id = b.customer_id
+        WHERE b.user_id = ?
+    """, (user_id,))
+    return [dict(row) for row in cursor.fetchall()]
+
+@_cached_read(per_user=False)
+def get_customer_balance(customer_id):
+    """Get running totals for one customer (None if they have no transactions)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM customer_balances WHERE customer_id=?", (customer_id,))
+    balance = cursor.fetchone()
+    return dict(balance) if balance else None
+
+def get_overdue_customers(user_id, min_days=None, today=None):
+    """
+    Customers with a pending balance and no transaction for more than min_days
+    (default: the shop's overdue_days), most overdue first - one query over customer_balances
+    Returns: list of dicts with customer_id, customer_name, customer_phone,
+             pending_amount, days_overdue, last_transaction_date
+    """
+    # today is resolved here so it is part of the cache key (no stale results after midnight)
+    return _get_overdue_customers(user_id, min_days, today_day() if today is None else today)
+
+@_cached_read()
+def _get_overdue_customers(user_id, min_days, today):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"{OVERDUE_CUSTOMERS_SQL} ORDER BY days_overdue DESC, c.id",
+                   {'user_id': user_id, 'today': today, 'min_days': min_days})
+    overdue = []
+    for row in cursor.fetchall():
+        customer = dict(row)
+        customer['last_transaction_date'] = from_day(customer.pop('last_txn_day')).strftime('%Y-%m-%d')
+        overdue.append(customer)
+    return overdue
+
+# Balances recomputed from the transactions table
+_BALANCES_FROM_TRANSACTIONS = """
+    SELECT 
+        customer_id,
+        MIN(user_id) as user_id,
+        SUM(CASE WHEN type = 'Credit' THEN amount ELSE 0 END) as total_credit,
+        SUM(CASE WHEN type = 'Debit' THEN amount ELSE 0 END) as total_debit,
+        MAX(date_day) as last_txn_day,
+        COUNT(*) as txn_count
+    FROM transactions
+"""
+_BALANCE_COLUMNS = "customer_id, user_id, total_credit, total_debit, last_txn_day, txn_count"
+
+@_invalidates_cache()
+def rebuild_customer_balances(user_id=None):
+    """Recompute customer_balances from transactions (one shop or all)"""
+    def write(cursor):
+        if user_id:
+            cursor.execute("DELETE FROM customer_balances WHERE user_id=?", (user_id,))
+            cursor.execute(f"INSERT INTO customer_balances({_BALANCE_COLUMNS}) {_BALANCES_FROM_TRANSACTIONS} WHERE user_id=? GROUP BY customer_id",
+                           (user_id,))
+        else:
+            cursor.execute("DELETE FROM customer_balances")
+            cursor.execute(f"INSERT INTO customer_balances({_BALANCE_COLUMNS}) {_BALANCES_FROM_TRANSACTIONS} GROUP BY customer_id")
+    
+    _run_write(write)
+
+def verify_customer_balances():
+    """
+    Compare customer_balances with totals recomputed from transactions
+    Returns: list of customer_ids whose stored balance is wrong or missing
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT t.customer_id
+        FROM ({_BALANCES_FROM_TRANSACTIONS} GROUP BY customer_id) t
+        LEFT JOIN customer_balances b ON b.customer_id = t.customer_id
+        WHERE b.customer_id IS NULL
+        OR ABS(b.total_credit - t.total_credit) > 0.005
+        OR ABS(b.total_debit - t.total_debit) > 0.005
+        OR b.last_txn_day IS NOT t.last_txn_day
+        OR b.txn_count != t.txn_count
+        UNION
+        SELECT customer_id FROM customer_balances
+        WHERE customer_id NOT IN (SELECT customer_id FROM transactions)
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+# --- DAILY SUMMARY FUNCTIONS ---
+
+# daily_summary holds credit/debit/count per shop per day; get_daily_totals
+# rolls it up into weeks and months. Charts read it instead of transactions,
+# so years of history cost a few thousand rows. add_transaction keeps it
+# current; rebuild_daily_summary recomputes it.
+
+_DAILY_UPSERT = """
+    INSERT INTO daily_summary(user_id, day, credit, debit, txn_count)
+    VALUES(?,?,?,?,?)
+    ON CONFLICT(user_id, day) DO UPDATE SET
+        credit = credit + excluded.credit,
+        debit = debit + excluded.debit,
+        txn_count = txn_count + excluded.txn_count
+"""
+
+def _apply_daily_change(cursor, user_id, trans_type, amount, date_day):
+    credit = amount if trans_type == 'Credit' else 0
+    debit = amount if trans_type == 'Debit' else 0
+    cursor.execute(_DAILY_UPSERT, (user_id, date_day, credit, debit, 1))
+
+def _apply_daily_changes(cursor, user_id, changes):
+    """changes: {date_day: [credit, debit, count]}"""
+    cursor.executemany(_DAILY_UPSERT, [
+        (user_id, date_day, credit, debit, count)
+        for date_day, (credit, debit, count) in changes.items()
+    ])
+
+# First day of the week (Monday, as 1970-01-05 was) or month containing an epoch day
+_PERIOD_START = {
+    'day': "day",
+    'week': "day - ((day + 3) % 7)",
+    'month': "CAST(julianday(date(day * 86400, 'unixepoch', 'start of month')) - 2440587.5 AS INTEGER)",
+}
+
+@_cached_read()
+def get_daily_totals(user_id, start_date=None, end_date=None, period='day'):
+    """
+    Credit and debit summed per day, week or month, oldest first (all time when no dates are given)
+    Returns: list of dicts with date_day (first day of the period), credit, debit, txn_count
+    
+    Weeks and months at the edges of the range only count the days inside it.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    day_filter, params = _day_range_clause(start_date, end_date, "day")
+    cursor.execute(f"""
+        SELECT 
+            {_PERIOD_START[period]} as date_day,
+            SUM(credit) as credit,
+            SUM(debit) as debit,
+            SUM(txn_count) as txn_count
+        FROM daily_summary
+        WHERE user_id = ?{day_filter}
+        GROUP BY 1
+        ORDER BY 1
+    """, (user_id, *params))
+    return [dict(row) for row in cursor.fetchall()]
+
+_DAILY_FROM_TRANSACTIONS = """
+    SELECT 
+        user_id,
+        date_day,
+        SUM(CASE WHEN type = 'Credit' THEN amount ELSE 0 END) as credit,
+        SUM(CASE WHEN type = 'Debit' THEN amount ELSE 0 END) as debit,
+        COUNT(*) as txn_count
+    FROM transactions
+"""
+
+@_invalidates_cache()
+def rebuild_daily_summary(user_id=None):
+    """Recompute daily_summary from transactions (one shop or all)"""
+    def write(cursor):
+        if user_id:
+            cursor.execute("DELETE FROM daily_summary WHERE user_id=?", (user_id,))
+            cursor.execute(f"INSERT INTO daily_summary(user_id, day, credit, debit, txn_count) {_DAILY_FROM_TRANSACTIONS} WHERE user_id=? GROUP BY user_id, date_day",
+                           (user_id,))
+        else:
+            cursor.execute("DELETE FROM daily_summary")
+            cursor.execute(f"INSERT INTO daily_summary(user_id, day, credit, debit, txn_count) {_DAILY_FROM_TRANSACTIONS} GROUP BY user_id, date_day")
+    
+    _run_write(write)
+
+def verify_daily_summary():
+    """
+    Compare daily_summary with totals recomputed from transactions
+    Returns: list of (user_id, day) rows that are wrong or missing
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT t.user_id, t.date_day
+        FROM ({_DAILY_FROM_TRANSACTIONS} GROUP BY user_id, date_day) t
+        LEFT JOIN daily_summary d ON d.user_id = t.user_id AND d.day = t.date_day
+        WHERE d.day IS NULL
+        OR ABS(d.credit - t.credit) > 0.005
+        OR ABS(d.debit - t.debit) > 0.005
+        OR d.txn_count != t.txn_count
+        UNION
+        SELECT d.user_id, d.day FROM daily_summary d
+        WHERE NOT EXISTS (SELECT 1 FROM transactions t WHERE t.user_id = d.user_id AND t.date_day = d.day)
+    """)
+    return [tuple(row) for row in cursor.fetchall()]
+
+# --- ALERT FUNCTIONS ---
+
+# alerts holds one row per low-stock item and per overdue customer, so the
+# notification badge is one indexed COUNT. Stock and transaction writes
+# update the rows they affect. How overdue a customer is depends on today's
+# date, so each shop's alerts are also recomputed on the first read of a
+# new day (the daily rollover).
+LOW_STOCK_THRESHOLD = 10
+OVERDUE_DAYS = 30
+
+_LOW_STOCK_ITEMS = f"""
+    SELECT i.id as ref_id, i.user_id
+    FROM inventory i
+    LEFT JOIN alert_settings s ON s.user_id = i.user_id
+    WHERE {{where}}
+    AND i.quantity < COALESCE(s.low_stock_threshold, {LOW_STOCK_THRESHOLD})
+"""
+
+# When a customer's balance row b (with the shop's alert_settings s) is
+# overdue: pending balance and no transaction for more than min_days (NULL:
+# the shop's overdue_days). The one definition behind the alerts badge, the
+# overdue lists and the reminder candidates; {today} and {min_days} take the
+# caller's placeholders.
+_OVERDUE_CONDITION = f"""b.total_credit - b.total_debit > 0
+    AND {{today}} - b.last_txn_day > COALESCE({{min_days}}, s.overdue_days, {OVERDUE_DAYS})"""
+
+# What every overdue list shows for a customer (b: customer_balances, c: customers)
+_OVERDUE_COLUMNS = """
+        c.id as customer_id,
+        c.name as customer_name,
+        COALESCE(c.contact, '') as customer_phone,
+        b.total_credit - b.total_debit as pending_amount,
+        :today - b.last_txn_day as days_overdue,
+        b.last_txn_day"""
+
+_OVERDUE_CUSTOMERS = f"""
+    SELECT b.customer_id as ref_id, b.user_id
+    FROM customer_balances b
+    LEFT JOIN alert_settings s ON s.user_id = b.user_id
+    WHERE {{where}}
+    AND {_OVERDUE_CONDITION.format(today='?', min_days='NULL')}
+"""
+
+# A shop's overdue customers. Named parameters :user_id, :today, :min_days;
+# also the base of auto_reminders' candidate query
+OVERDUE_CUSTOMERS_SQL = f"""
+    SELECT{_OVERDUE_COLUMNS}
+    FROM customer_balances b
+    JOIN customers c ON c.id = b.customer_id
+    LEFT JOIN alert_settings s ON s.user_id = b.user_id
+    WHERE b.user_id = :user_id
+    AND {_OVERDUE_CONDITION.format(today=':today', min_days=':min_days')}
+"""
+
+def _sync_alerts(cursor, kind, flagged_sql, scope_sql, where, params):
+    """Make the alerts of one kind within scope match flagged_sql, keeping since_day for ones that stay"""
+    flagged = flagged_sql.format(where=where)
+    scope = scope_sql.format(where=where)
+    today = today_day()
+    extra = (today,) if kind == 'overdue' else ()
+    cursor.execute(f"DELETE FROM alerts WHERE kind=? AND ref_id IN ({scope}) AND ref_id NOT IN (SELECT ref_id FROM ({flagged}))",
+                   (kind, *params, *params, *extra))
+    cursor.execute(f"INSERT OR IGNORE INTO alerts(kind, ref_id, user_id, since_day) SELECT ?, ref_id, user_id, ? FROM ({flagged})",
+                   (kind, today, *params, *extra))
+
+def _sync_low_stock_alerts(cursor, item_ids):
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), 500):
+        chunk = item_ids[start:start + 500]
+        where = f"i.id IN ({','.join('?' * len(chunk))})"
+        _sync_alerts(cursor, 'low_stock', _LOW_STOCK_ITEMS, "SELECT i.id FROM inventory i WHERE {where}", where, chunk)
+
+def _sync_overdue_alerts(cursor, customer_ids):
+    customer_ids = list(customer_ids)
+    for start in range(0, len(customer_ids), 500):
+        chunk = customer_ids[start:start + 500]
+        where = f"b.customer_id IN ({','.join('?' * len(chunk))})"
+        _sync_alerts(cursor, 'overdue', _OVERDUE_CUSTOMERS, "SELECT b.customer_id FROM customer_balances b WHERE {where}", where, chunk)
+
+def _sync_shop_alerts(cursor, user_id):
+    """Recompute every alert for one shop"""
+    _sync_alerts(cursor, 'low_stock', _LOW_STOCK_ITEMS, "SELECT i.id FROM inventory i WHERE {where}", "i.user_id = ?", (user_id,))
+    _sync_alerts(cursor, 'overdue', _OVERDUE_CUSTOMERS, "SELECT b.customer_id FROM customer_balances b WHERE {where}", "b.user_id = ?", (user_id,))
+
+_alerts_rolled_over = {}  # user_id -> day this process last saw the rollover done
+
+def refresh_alerts(user_id):
+    """Run the daily rollover for a shop if it hasn't happened today (no SQL once it has)"""
+    today = today_day()
+    if _alerts_rolled_over.get(user_id) == today:
+        return
+    
+    def write(cursor):
+        cursor.execute("SELECT last_rollover_day FROM alert_settings WHERE user_id=?", (user_id,))
+        row = cursor.fetchone()
+        if row and row[0] == today:
+            return False
+        _sync_shop_alerts(cursor, user_id)
+        cursor.execute("""
+            INSERT INTO alert_settings(user_id, last_rollover_day) VALUES(?,?)
+            ON CONFLICT(user_id) DO UPDATE SET last_rollover_day = excluded.last_rollover_day
+        """, (user_id, today))
+        return True
+    
+    if _run_write(write):
+        invalidate_cache(user_id)
+    _alerts_rolled_over[user_id] = today
+
+@_invalidates_cache()
+def rebuild_alerts(user_id=None):
+    """Recompute alerts from inventory and customer_balances (one shop or all)"""
+    def write(cursor):
+        if user_id:
+            user_ids = [user_id]
+        else:
+            cursor.execute("DELETE FROM alerts")
+            cursor.execute("SELECT id FROM users")
+            user_ids = [row[0] for row in cursor.fetchall()]
+        for shop_id in user_ids:
+            _sync_shop_alerts(cursor, shop_id)
+    
+    _run_write(write)
+
+@_cached_read()
+def get_alert_settings(user_id):
+    """Alert thresholds for a shop, with defaults filled in"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO suppliers(user_id, supplier_name, contact, amount_due, amount_paid) VALUES(?,?,?,?,?)", 
-                   (user_id, name, contact, due, paid))
-    conn.commit()
-    conn.close()
+    cursor.execute("SELECT low_stock_threshold, overdue_days FROM alert_settings WHERE user_id=?", (user_id,))
+    row = cursor.fetchone()
+    return {
+        'low_stock_threshold': row[0] if row and row[0] is not None else LOW_STOCK_THRESHOLD,
+        'overdue_days': row[1] if row and row[1] is not None else OVERDUE_DAYS
+    }
+
+@_invalidates_cache()
+def set_low_stock_threshold(user_id, threshold):
+    """Change a shop's low stock threshold and re-flag its items"""
+    def write(cursor):
+        cursor.execute("""
+            INSERT INTO alert_settings(user_id, low_stock_threshold) VALUES(?,?)
+            ON CONFLICT(user_id) DO UPDATE SET low_stock_threshold = excluded.low_stock_threshold
+        """, (user_id, threshold))
+        _sync_alerts(cursor, 'low_stock', _LOW_STOCK_ITEMS, "SELECT i.id FROM inventory i WHERE {where}", "i.user_id = ?", (user_id,))
+    
+    _run_write(write)
+
+@_cached_read()
+def _get_alert_count(user_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM alerts WHERE user_id=?", (user_id,))
+    return cursor.fetchone()[0]
+
+def get_alert_count(user_id):
+    """Number of open notifications (low stock items + overdue customers)"""
+    refresh_alerts(user_id)
+    return _get_alert_count(user_id)
+
+@_cached_read()
+def _get_low_stock_alerts(user_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT i.*
+        FROM alerts a
+        JOIN inventory i ON i.id = a.ref_id
+        WHERE a.user_id = ? AND a.kind = 'low_stock'
+        ORDER BY i.quantity
+    """, (user_id,))
+    return [dict(row) for row in cursor.fetchall()]
+
+def get_low_stock_alerts(user_id):
+    """Inventory items below the shop's low stock threshold, lowest stock first"""
+    refresh_alerts(user_id)
+    return _get_low_stock_alerts(user_id)
+
+@_cached_read()
+def _get_overdue_alerts(user_id, today):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT{_OVERDUE_COLUMNS}
+        FROM alerts a
+        JOIN customer_balances b ON b.customer_id = a.ref_id
+        JOIN customers c ON c.id = a.ref_id
+        WHERE a.user_id = :user_id AND a.kind = 'overdue'
+        ORDER BY days_overdue DESC, c.id
+    """, {'user_id': user_id, 'today': today})
+    overdue = []
+    for row in cursor.fetchall():
+        customer = dict(row)
+        customer['last_transaction_date'] = from_day(customer.pop('last_txn_day')).strftime('%Y-%m-%d')
+        overdue.append(customer)
+    return overdue
+
+def get_overdue_alerts(user_id):
+    """Customers with a pending balance and no transaction for longer than the shop's overdue_days, most overdue first"""
+    refresh_alerts(user_id)
+    return _get_overdue_alerts(user_id, today_day())
+
+# --- SUPPLIER FUNCTIONS ---
 
+@_invalidates_cache()
+def add_supplier(user_id, name, contact, due, paid):
+    def write(cursor):
+        cursor.execute("INSERT INTO suppliers(user_id, supplier_name, contact, amount_due, amount_paid) VALUES(?,?,?,?,?)",
+                       (user_id, name, contact, due, paid))
+    
+    _run_write(write)
+
+@_cached_read()
 def get_suppliers(user_id):
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM suppliers WHERE user_id=?", (user_id,))
     suppliers = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return suppliers
 
+@_invalidates_cache(per_user=False)
 def update_supplier_due(supplier_id, amount):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE suppliers SET amount_due = amount_due + ? WHERE id=?", (amount, supplier_id))
-    conn.commit()
-    conn.close()
+    def write(cursor):
+        cursor.execute("UPDATE suppliers SET amount_due = amount_due + ? WHERE id=?", (amount, supplier_id))
+    
+    _run_write(write)
+
+@_invalidates_cache()
+def record_supplier_purchase(user_id, supplier_id, item, quantity, unit_price):
+    """
+    Record a stock purchase from a supplier in one DB transaction
+    item: inventory item id to restock, or a name (str) to add a new item
+    Returns: (success: bool, message: str)
+    """
+    total_amount = quantity * unit_price
+    
+    def write(cursor):
+        if not isinstance(item, str):
+            cursor.execute("SELECT item_name FROM inventory WHERE id=? AND user_id=?", (item, user_id))
+            existing = cursor.fetchone()
+            if not existing:
+                return False, "Item not found!"
+        
+        cursor.execute("UPDATE suppliers SET amount_due = amount_due + ? WHERE id=? AND user_id=?",
+                       (total_amount, supplier_id, user_id))
+        if cursor.rowcount == 0:
+            return False, "Supplier not found!"
+        
+        if isinstance(item, str):
+            cursor.execute("INSERT INTO inventory(user_id, item_name, quantity, price_per_unit, cost_price) VALUES(?,?,?,?,?)",
+                           (user_id, item, quantity, unit_price, 0.0))
+            item_id = cursor.lastrowid
+            item_name = item
+        else:
+            # Relative increment, so concurrent sales and purchases aren't lost
+            cursor.execute("UPDATE inventory SET quantity = quantity + ? WHERE id=?", (quantity, item))
+            item_id = item
+            item_name = existing['item_name']
+        _sync_low_stock_alerts(cursor, [item_id])
+        
+        return True, f"{item_name} +{quantity} units, supplier due increased by ₹{total_amount:,.2f}"
+    
+    try:
+        return _run_write(write)
+    except Exception as e:
+        return False, f"Error: {str(e)}"
 
+@_invalidates_cache(per_user=False)
 def update_supplier_payment(supplier_id, amount):
+    def write(cursor):
+        cursor.execute("UPDATE suppliers SET amount_paid = amount_paid + ? WHERE id=?", (amount, supplier_id))
+    
+    _run_write(write)
+
+# --- DATAFRAME FUNCTIONS ---
+
+# Analytics pages want pandas DataFrames. These build typed columns straight
+# from the cursor in chunks instead of going sqlite3.Row -> dict -> DataFrame,
+# so a million-row export never holds a million dicts. pandas is imported
+# inside _read_frame so pages that don't need it never load it.
+
+FRAME_CHUNK_ROWS = 50000
+
+TRANSACTION_COLUMN_TYPES = {'id': 'int64', 'user_id': 'int64', 'customer_id': 'int64',
+                            'amount': 'float64'}
+INVENTORY_COLUMN_TYPES = {'id': 'int64', 'user_id': 'int64', 'quantity': 'int64',
+                          'price_per_unit': 'float64', 'cost_price': 'float64'}
+CUSTOMER_COLUMN_TYPES = {'id': 'int64', 'user_id': 'int64'}
+SUPPLIER_COLUMN_TYPES = {'id': 'int64', 'user_id': 'int64',
+                         'amount_due': 'float64', 'amount_paid': 'float64'}
+
+def _column_array(values, dtype):
+    import numpy as np
+    try:
+        return np.array(values, dtype=dtype or object)
+    except (TypeError, ValueError):
+        # NULLs in a numeric column
+        return np.array(values, dtype='float64' if dtype == 'int64' else object)
+
+def _read_frame(sql, params, column_types):
+    """Run a query and return its result as a DataFrame with typed columns"""
+    import numpy as np
+    import pandas as pd
+    
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("UPDATE suppliers SET amount_paid = amount_paid + ? WHERE id=?", (amount, supplier_id))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    cursor.row_factory = None  # plain tuples
+    cursor.execute(sql, params)
+    names = [column[0] for column in cursor.description]
+    
+    chunks = {name: [] for name in names}
+    while True:
+        rows = cursor.fetchmany(FRAME_CHUNK_ROWS)
+        if not rows:
+            break
+        for name, values in zip(names, zip(*rows)):
+            chunks[name].append(_column_array(values, column_types.get(name)))
+        del rows
+    
+    columns = {}
+    for name in names:
+        parts = chunks.pop(name)
+        if not parts:
+            columns[name] = np.array([], dtype=column_types.get(name) or object)
+        elif len(parts) == 1:
+            columns[name] = parts[0]
+        else:
+            columns[name] = np.concatenate(parts)
+    return pd.DataFrame(columns, copy=False)
+
+@_cached_read()
+def get_transactions_frame(user_id, start_date=None, end_date=None, customer_id=None):
+    """Transactions as a DataFrame, newest first, optionally limited to a date range (date_day is internal and left out)"""
+    sql = "SELECT id, user_id, customer_id, type, amount, date, description FROM transactions WHERE user_id=?"
+    params = [user_id]
+    if customer_id:
+        sql += " AND customer_id=?"
+        params.append(customer_id)
+    day_filter, day_params = _day_range_clause(start_date, end_date)
+    sql += day_filter + " ORDER BY date_day DESC, id DESC"
+    params += day_params
+    return _read_frame(sql, params, TRANSACTION_COLUMN_TYPES)
+
+@_cached_read()
+def get_inventory_frame(user_id):
+    return _read_frame("SELECT * FROM inventory WHERE user_id=?", (user_id,), INVENTORY_COLUMN_TYPES)
+
+@_cached_read()
+def get_customers_frame(user_id):
+    return _read_frame("SELECT * FROM customers WHERE user_id=?", (user_id,), CUSTOMER_COLUMN_TYPES)
+
+@_cached_read()
+def get_suppliers_frame(user_id):
+    return _read_frame("SELECT * FROM suppliers WHERE user_id=?", (user_id,), SUPPLIER_COLUMN_TYPES)
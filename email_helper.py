@@ -2,191 +2,116 @@
 Email Notification Helper
 Sends email notifications for low stock and overdue payments
 
-Uses Python's built-in smtplib for sending emails
+Email bodies are built as email_templates blocks and rendered to HTML and
+plain text; emails are queued in the outbox and sent in the background (see outbox.py)
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime
 import streamlit as st
+import outbox
+import email_templates as tpl
 
 def send_notification_email(to_email, subject, body):
     """
-    Send email notification using Gmail SMTP
+    Queue an email notification for the background sender (see outbox.py)
     
     Args:
         to_email: Recipient email address
         subject: Email subject
-        body: Email body (HTML supported)
+        body: Email body as a list of email_templates blocks, or an HTML string
     
     Returns:
         (success: bool, message: str)
     """
     
-    # Email configuration - using a generic SMTP approach
-    # For production, you should configure these in session state or environment variables
-    
     # Check if email settings are configured
     if 'email_settings' not in st.session_state or not st.session_state.email_settings.get('enabled', False):
         return False, "Email notifications are not configured. Please enable them in Settings."
     
     email_config = st.session_state.email_settings
+    smtp_email = email_config.get('smtp_email', '')
+    smtp_password = email_config.get('smtp_password', '')
+    
+    if not smtp_email or not smtp_password:
+        return False, "Email credentials not configured"
     
     try:
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = email_config.get('smtp_email', '')
-        message["To"] = to_email
-        
-        # Create HTML and plain text versions
-        text_body = body.replace('<br>', '\n').replace('<b>', '').replace('</b>', '')
-        html_body = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                {body}
-                <br><br>
-                <hr style="border: 1px solid #e0e0e0;">
-                <p style="color: #666; font-size: 12px;">
-                    This is an automated notification from Vyapar DigiKhata<br>
-                    Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                </p>
-            </body>
-        </html>
-        """
-        
-        # Attach both versions
-        part1 = MIMEText(text_body, "plain")
-        part2 = MIMEText(html_body, "html")
-        message.attach(part1)
-        message.attach(part2)
-        
-        # Send email based on provider
-        smtp_server = email_config.get('smtp_server', 'smtp.gmail.com')
-        smtp_port = email_config.get('smtp_port', 587)
-        smtp_email = email_config.get('smtp_email', '')
-        smtp_password = email_config.get('smtp_password', '')
+        # HTML and plain text versions, both rendered from the same blocks
+        blocks = [tpl.raw_html(body)] if isinstance(body, str) else body
+        html_body, text_body = tpl.render(blocks)
         
-        if not smtp_email or not smtp_password:
-            return False, "Email credentials not configured"
+        # Delivery, retries and rate limits are handled by the outbox sender thread
+        user_id = st.session_state.user['id']
+        outbox.register_account(user_id, email_config)
+        outbox.enqueue_email(user_id, smtp_email, to_email, subject, html_body, text_body)
+        outbox.start_sender()
         
-        # Connect to SMTP server
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_email, smtp_password)
-            server.send_message(message)
+        return True, "Email queued for delivery"
         
-        return True, "Email sent successfully"
-        
-    except smtplib.SMTPAuthenticationError:
-        return False, "Authentication failed. Please check your email and password."
-    except smtplib.SMTPException as e:
-        return False, f"SMTP error: {str(e)}"
     except Exception as e:
-        return False, f"Error sending email: {str(e)}"
+        return False, f"Error queuing email: {str(e)}"
 
 def generate_low_stock_email(low_stock_items, shop_name):
-    """Generate email body for low stock notification"""
+    """Generate email blocks for low stock notification"""
     
     critical_items = [item for item in low_stock_items if item['quantity'] <= 5]
     low_items = [item for item in low_stock_items if item['quantity'] > 5]
+    columns = [("Item Name", "left"), ("Stock", "center"), ("Price/Unit", "right")]
     
-    body = f"""
-    <h2 style="color: #e74c3c;">🔔 Low Stock Alert - {shop_name}</h2>
-    <p>Dear Shop Owner,</p>
-    <p>This is an automated notification about items running low in your inventory.</p>
-    """
+    blocks = [
+        tpl.heading(f"🔔 Low Stock Alert - {shop_name}", tone='alert'),
+        tpl.paragraph("Dear Shop Owner,"),
+        tpl.paragraph("This is an automated notification about items running low in your inventory."),
+    ]
     
     if critical_items:
-        body += f"""
-        <h3 style="color: #c0392b;">🔴 Critical Stock ({len(critical_items)} items with ≤5 units)</h3>
-        <table style="border-collapse: collapse; width: 100%; margin: 10px 0;">
-            <tr style="background-color: #f8d7da;">
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Item Name</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: center;">Stock</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: right;">Price/Unit</th>
-            </tr>
-        """
-        for item in critical_items:
-            body += f"""
-            <tr>
-                <td style="border: 1px solid #ddd; padding: 8px;">{item['item_name']}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center; color: #c0392b;"><b>{item['quantity']}</b></td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: right;">₹{item['price_per_unit']:.2f}</td>
-            </tr>
-            """
-        body += "</table>"
+        blocks.append(tpl.heading(f"🔴 Critical Stock ({len(critical_items)} items with ≤5 units)", tone='critical', level=3))
+        blocks.append(tpl.table(columns, [
+            (item['item_name'], str(item['quantity']), f"₹{item['price_per_unit']:.2f}") for item in critical_items
+        ], tone='critical', strong_column=1))
     
     if low_items:
-        body += f"""
-        <h3 style="color: #f39c12;">🟡 Low Stock ({len(low_items)} items with 6-10 units)</h3>
-        <table style="border-collapse: collapse; width: 100%; margin: 10px 0;">
-            <tr style="background-color: #fff3cd;">
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Item Name</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: center;">Stock</th>
-                <th style="border: 1px solid #ddd; padding: 8px; text-align: right;">Price/Unit</th>
-            </tr>
-        """
-        for item in low_items:
-            body += f"""
-            <tr>
-                <td style="border: 1px solid #ddd; padding: 8px;">{item['item_name']}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center; color: #f39c12;"><b>{item['quantity']}</b></td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: right;">₹{item['price_per_unit']:.2f}</td>
-            </tr>
-            """
-        body += "</table>"
+        blocks.append(tpl.heading(f"🟡 Low Stock ({len(low_items)} items with 6-10 units)", tone='warning', level=3))
+        blocks.append(tpl.table(columns, [
+            (item['item_name'], str(item['quantity']), f"₹{item['price_per_unit']:.2f}") for item in low_items
+        ], tone='warning', strong_column=1))
     
-    body += """
-    <p><b>Action Required:</b> Please restock these items to avoid running out of inventory.</p>
-    <p>Login to your Vyapar DigiKhata dashboard to manage your inventory.</p>
-    """
+    blocks += [
+        tpl.paragraph("Please restock these items to avoid running out of inventory.", label="Action Required:"),
+        tpl.paragraph("Login to your Vyapar DigiKhata dashboard to manage your inventory."),
+    ]
     
-    return body
+    return blocks
 
 def generate_overdue_payment_email(overdue_customers, shop_name):
-    """Generate email body for overdue payment notification"""
+    """Generate email blocks for overdue payment notification"""
     
     total_overdue_amount = sum(customer['pending_amount'] for customer in overdue_customers)
     
-    body = f"""
-    <h2 style="color: #e67e22;">💰 Overdue Payment Alert - {shop_name}</h2>
-    <p>Dear Shop Owner,</p>
-    <p>This is an automated notification about customers with overdue payments.</p>
-    
-    <h3 style="color: #d35400;">Customer Payment Status</h3>
-    <table style="border-collapse: collapse; width: 100%; margin: 10px 0;">
-        <tr style="background-color: #ffe5cc;">
-            <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Customer Name</th>
-            <th style="border: 1px solid #ddd; padding: 8px; text-align: right;">Pending Amount</th>
-            <th style="border: 1px solid #ddd; padding: 8px; text-align: center;">Days Overdue</th>
-            <th style="border: 1px solid #ddd; padding: 8px; text-align: center;">Last Transaction</th>
-        </tr>
-    """
-    
-    for customer in overdue_customers:
-        body += f"""
-        <tr>
-            <td style="border: 1px solid #ddd; padding: 8px;">{customer['customer_name']}</td>
-            <td style="border: 1px solid #ddd; padding: 8px; text-align: right;">₹{customer['pending_amount']:,.2f}</td>
-            <td style="border: 1px solid #ddd; padding: 8px; text-align: center; color: #e67e22;"><b>{customer['days_overdue']}</b></td>
-            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{customer['last_transaction_date']}</td>
-        </tr>
-        """
-    
-    body += f"""
-    </table>
-    
-    <div style="background-color: #fff3e0; padding: 15px; border-left: 4px solid #ff9800; margin: 15px 0;">
-        <p style="margin: 0;"><b>Total Overdue Amount: ₹{total_overdue_amount:,.2f}</b></p>
-    </div>
-    
-    <p><b>Action Required:</b> Please follow up with these customers to collect pending payments.</p>
-    <p>Login to your Vyapar DigiKhata dashboard to view detailed transaction history.</p>
-    """
-    
-    return body
+    return [
+        tpl.heading(f"💰 Overdue Payment Alert - {shop_name}", tone='overdue'),
+        tpl.paragraph("Dear Shop Owner,"),
+        tpl.paragraph("This is an automated notification about customers with overdue payments."),
+        tpl.heading("Customer Payment Status", tone='overdue-dark', level=3),
+        tpl.table(
+            [("Customer Name", "left"), ("Pending Amount", "right"), ("Days Overdue", "center"), ("Last Transaction", "center")],
+            [(customer['customer_name'], f"₹{customer['pending_amount']:,.2f}", str(customer['days_overdue']),
+              customer['last_transaction_date']) for customer in overdue_customers],
+            tone='overdue', strong_column=2
+        ),
+        tpl.callout(f"Total Overdue Amount: ₹{total_overdue_amount:,.2f}"),
+        tpl.paragraph("Please follow up with these customers to collect pending payments.", label="Action Required:"),
+        tpl.paragraph("Login to your Vyapar DigiKhata dashboard to view detailed transaction history."),
+    ]
+
+def generate_test_email(username, account_email):
+    """Generate email blocks for the Settings test email"""
+    return [
+        tpl.heading("Test Email Successful! ✅", tone='info'),
+        tpl.paragraph("Your Vyapar DigiKhata email notifications are working correctly."),
+        tpl.bullets(["📦 Low Stock Alerts", "💰 Overdue Payment Alerts"]),
+        tpl.paragraph(username, label="Shop Owner:"),
+        tpl.paragraph(account_email, label="Account:"),
+    ]
 
 def send_low_stock_notification(user_email, low_stock_items, shop_name):
     """Send low stock notification email"""
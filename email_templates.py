@@ -0,0 +1,226 @@
+"""
+Email Templates
+A notification email is a list of blocks (headings, paragraphs, tables,
+callouts) built by email_helper. The same blocks are rendered twice: to HTML
+through layouts compiled once at import, and to plain text.
+
+Styles are inline (many mail clients strip <head><style>); the style strings
+per tone and alignment are built once at import. A table's cells are escaped
+in one pass (non-ASCII as character references, keeping the HTML one byte per
+character), and its rows are joined from the cell columns and the constant
+text between them by iterators, with no Python call per row. Each message is
+then assembled with a single join.
+"""
+
+from datetime import datetime
+from html import escape
+from itertools import chain, repeat
+from string import Template
+
+# ─────────────────────────────────────────────
+# Blocks
+# ─────────────────────────────────────────────
+def heading(text, tone=None, level=2):
+    return {'type': 'heading', 'text': text, 'tone': tone, 'level': level}
+
+def paragraph(text, label=None):
+    """label is shown in bold before the text, e.g. 'Action Required:'"""
+    return {'type': 'paragraph', 'text': text, 'label': label}
+
+def bullets(items):
+    return {'type': 'bullets', 'items': items}
+
+def table(columns, rows, tone=None, strong_column=None):
+    """
+    columns: list of (title, align) with align 'left', 'center' or 'right'
+    rows: list of tuples of already formatted cell strings
+    strong_column: index of a column shown in bold, in the table's tone colour
+    """
+    return {'type': 'table', 'columns': columns, 'rows': rows, 'tone': tone, 'strong_column': strong_column}
+
+def callout(text):
+    return {'type': 'callout', 'text': text}
+
+def raw_html(html):
+    """Ready-made HTML, inserted as is; its plain text drops <b> and turns <br> into line breaks"""
+    return {'type': 'raw_html', 'html': html}
+
+# ─────────────────────────────────────────────
+# HTML
+# ─────────────────────────────────────────────
+# (text colour, table header background) per tone
+TONES = {
+    'alert': ('#e74c3c', None),
+    'critical': ('#c0392b', '#f8d7da'),
+    'warning': ('#f39c12', '#fff3cd'),
+    'overdue': ('#e67e22', '#ffe5cc'),
+    'overdue-dark': ('#d35400', None),
+    'info': ('#0284C7', None),
+}
+
+# Inline style attributes, built once: mail clients that strip <style> keep these
+_CELL_STYLE = 'border: 1px solid #ddd; padding: 8px;'
+_ALIGN_STYLE = {align: f' style="{_CELL_STYLE} text-align: {align};"' for align in ('left', 'center', 'right')}
+_TONE_STYLE = {name: f' style="color: {color};"' for name, (color, _) in TONES.items()}
+_HEAD_STYLE = {name: f' style="background-color: {background};"' for name, (_, background) in TONES.items() if background}
+_TABLE_STYLE = ' style="border-collapse: collapse; width: 100%; margin: 10px 0;"'
+_CALLOUT_STYLE = ' style="background-color: #fff3e0; padding: 15px; border-left: 4px solid #ff9800; margin: 15px 0;"'
+
+_HTML_LAYOUT = Template("""<html>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+$content
+<br><br>
+<hr style="border: 1px solid #e0e0e0;">
+<p style="color: #666; font-size: 12px;">
+    This is an automated notification from Vyapar DigiKhata<br>
+    Generated on: $generated_at
+</p>
+</body>
+</html>
+""")
+_HTML_HEAD, _HTML_FOOT = _HTML_LAYOUT.template.split("$content\n")
+_HTML_FOOT = Template("\n" + _HTML_FOOT)
+
+def _escape(text):
+    # Non-ASCII (the rupee sign, emoji) goes out as character references, so the
+    # HTML of a large table stays one byte per character instead of four
+    return escape(text).encode('ascii', 'xmlcharrefreplace').decode('ascii')
+
+# Cells are joined with this before escaping, so a whole table is escaped at once
+_CELL_SEPARATOR = "\x1f"
+
+def _tone_style(tone):
+    return _TONE_STYLE[tone] if tone else ""
+
+def _heading_html(block):
+    level = block['level']
+    return f"<h{level}{_tone_style(block['tone'])}>{_escape(block['text'])}</h{level}>"
+
+def _paragraph_html(block):
+    label = f"<b>{_escape(block['label'])}</b> " if block['label'] else ""
+    return f"<p>{label}{_escape(block['text'])}</p>"
+
+def _bullets_html(block):
+    items = "".join(f"<li>{_escape(item)}</li>" for item in block['items'])
+    return f"<ul>{items}</ul>"
+
+def _table_html(block):
+    tone = block['tone']
+    head_style = _HEAD_STYLE.get(tone, "")
+    header = "".join(f'<th{_ALIGN_STYLE[align]}>{_escape(title)}</th>' for title, align in block['columns'])
+
+    # One row template per table; the text around its cells is the same in every row
+    cells = []
+    for index, (_, align) in enumerate(block['columns']):
+        if index == block['strong_column']:
+            cells.append(f'<td{_ALIGN_STYLE[align]}><b{_tone_style(tone)}>{{}}</b></td>')
+        else:
+            cells.append(f'<td{_ALIGN_STYLE[align]}>{{}}</td>')
+    literals = ("<tr>" + "".join(cells) + "</tr>\n").split("{}")
+    rows = block['rows']
+    width = len(block['columns'])
+    values = _escape(_CELL_SEPARATOR.join(chain.from_iterable(rows))).split(_CELL_SEPARATOR) if rows else []
+
+    # Interleave the constant text with each column's cells and join the table in one go
+    streams = []
+    for index in range(width):
+        streams += [repeat(literals[index]), values[index::width]]
+    streams.append(repeat(literals[width]))
+    body = "".join(chain.from_iterable(zip(*streams)))
+
+    return f'<table{_TABLE_STYLE}>\n<tr{head_style}>{header}</tr>\n{body}</table>'
+
+def _callout_html(block):
+    return f'<div{_CALLOUT_STYLE}><p style="margin: 0;"><b>{_escape(block["text"])}</b></p></div>'
+
+def _raw_html(block):
+    return block['html']
+
+_HTML_RENDERERS = {
+    'heading': _heading_html,
+    'paragraph': _paragraph_html,
+    'bullets': _bullets_html,
+    'table': _table_html,
+    'callout': _callout_html,
+    'raw_html': _raw_html,
+}
+
+# ─────────────────────────────────────────────
+# Plain text
+# ─────────────────────────────────────────────
+_TEXT_LAYOUT = Template("""$content
+
+--
+This is an automated notification from Vyapar DigiKhata
+Generated on: $generated_at
+""")
+_TEXT_HEAD, _TEXT_FOOT = _TEXT_LAYOUT.template.split("$content")
+_TEXT_FOOT = Template(_TEXT_FOOT)
+
+_TEXT_ALIGN = {'left': '<', 'center': '^', 'right': '>'}
+
+def _heading_text(block):
+    text = block['text']
+    return f"{text}\n{('=' if block['level'] <= 2 else '-') * len(text)}"
+
+def _paragraph_text(block):
+    return f"{block['label']} {block['text']}" if block['label'] else block['text']
+
+def _bullets_text(block):
+    return "\n".join(f"  * {item}" for item in block['items'])
+
+def _table_text(block):
+    columns = block['columns']
+    rows = block['rows']
+    widths = [len(title) for title, _ in columns]
+    for index, column in enumerate(zip(*rows)):
+        widths[index] = max(widths[index], max(map(len, column)))
+
+    row_template = "  ".join(f"{{:{_TEXT_ALIGN[align]}{widths[index]}}}" for index, (_, align) in enumerate(columns))
+    lines = [row_template.format(*(title for title, _ in columns)),
+             "  ".join("-" * width for width in widths)]
+    if rows:
+        # The row template repeated once per row, filled by a single format()
+        lines += "\n".join([row_template] * len(rows)).format(*chain.from_iterable(rows)).split("\n")
+    return "\n".join(map(str.rstrip, lines))
+
+def _callout_text(block):
+    return f">> {block['text']}"
+
+def _raw_html_text(block):
+    return block['html'].replace('<br>', '\n').replace('<b>', '').replace('</b>', '')
+
+_TEXT_RENDERERS = {
+    'heading': _heading_text,
+    'paragraph': _paragraph_text,
+    'bullets': _bullets_text,
+    'table': _table_text,
+    'callout': _callout_text,
+    'raw_html': _raw_html_text,
+}
+
+# ─────────────────────────────────────────────
+# Rendering
+# ─────────────────────────────────────────────
+def _assemble(head, parts, separator, foot):
+    # One join for the whole message: a large table is copied (and widened to the
+    # emoji's 4-byte width) once, not again by a content join and a substitute()
+    pieces = list(chain.from_iterable(zip(repeat(separator), parts)))
+    pieces[:1] = [head]
+    pieces.append(foot)
+    return "".join(pieces)
+
+def render_html(blocks, generated_at=None):
+    generated_at = generated_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    parts = [_HTML_RENDERERS[block['type']](block) for block in blocks]
+    return _assemble(_HTML_HEAD, parts, "\n", _HTML_FOOT.substitute(generated_at=generated_at))
+
+def render_text(blocks, generated_at=None):
+    generated_at = generated_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    parts = [_TEXT_RENDERERS[block['type']](block) for block in blocks]
+    return _assemble(_TEXT_HEAD, parts, "\n\n", _TEXT_FOOT.substitute(generated_at=generated_at))
+
+def render(blocks):
+    """Returns: (html, text) for the same blocks, stamped with one generation time"""
+    generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return render_html(blocks, generated_at), render_text(blocks, generated_at)
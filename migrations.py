@@ -0,0 +1,571 @@
+"""
+Schema Migrations
+Ordered, versioned schema changes for the Vyapar DigiKhata database.
+
+Each step runs exactly once and is recorded in the schema_version table.
+The app applies pending steps once at startup (database.init_db), and
+they can also be applied by hand.
+
+Usage:
+    python migrations.py                   # apply pending migrations
+    python migrations.py status            # show applied and pending versions
+    python migrations.py check-plans       # fail if a hot query scans a whole table
+    python migrations.py rebuild-balances  # recompute customer_balances
+    python migrations.py verify-balances   # compare customer_balances with transactions
+    python migrations.py rebuild-rollups   # recompute daily_summary
+    python migrations.py verify-rollups    # compare daily_summary with transactions
+    python migrations.py rebuild-alerts    # recompute low stock and overdue alerts
+"""
+
+import sys
+import sqlite3
+from datetime import date
+import database as db
+
+# ─────────────────────────────────────────────
+# Migration steps
+# ─────────────────────────────────────────────
+def _create_base_tables(cursor):
+    # Users Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS users(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_name TEXT,
+        email TEXT,
+        shop_name TEXT,
+        password TEXT
+    )
+    """)
+
+    # Customers Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS customers(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        name TEXT,
+        contact TEXT UNIQUE,
+        address TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    # Inventory Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS inventory(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        item_name TEXT,
+        quantity INTEGER,
+        price_per_unit REAL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    # Transactions Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS transactions(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        customer_id INTEGER,
+        type TEXT,
+        amount REAL,
+        date TEXT,
+        description TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id),
+        FOREIGN KEY(customer_id) REFERENCES customers(id)
+    )
+    """)
+
+    # Suppliers Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS suppliers(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        supplier_name TEXT,
+        contact TEXT,
+        amount_due REAL,
+        amount_paid REAL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    # Payment Reminders Table (used by auto_reminders)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS payment_reminders(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        customer_id INTEGER NOT NULL,
+        reminder_day INTEGER NOT NULL,
+        sent_date TEXT NOT NULL,
+        pending_amount REAL NOT NULL,
+        days_overdue INTEGER NOT NULL,
+        status TEXT DEFAULT 'sent',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (customer_id) REFERENCES customers(id)
+    )
+    """)
+
+def _add_inventory_cost_price(cursor):
+    # Older databases got this column lazily from add_inventory_item/get_inventory
+    cursor.execute("PRAGMA table_info(inventory)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    if 'cost_price' not in columns:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN cost_price REAL DEFAULT 0.0")
+
+def _add_hot_query_indexes(cursor):
+    # One index per lookup done by database.py / auto_reminders.py
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, date)")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_customer_date
+        ON transactions(user_id, customer_id, date)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_user ON customers(user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_user ON inventory(user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_suppliers_user ON suppliers(user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    # status is included so the dedupe lookups and grouped stats, which skip
+    # failed sends, stay index-only
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_payment_reminders_lookup
+        ON payment_reminders(user_id, customer_id, reminder_day, sent_date, status)
+    """)
+
+def _add_transaction_date_day(cursor):
+    # date_day = days since 1970-01-01 (see database.to_day), backfilled from the text date
+    cursor.execute("ALTER TABLE transactions ADD COLUMN date_day INTEGER")
+    cursor.execute("UPDATE transactions SET date_day = CAST(julianday(substr(date, 1, 10)) - 2440587.5 AS INTEGER)")
+
+    # Range scans and ordering now go through date_day
+    cursor.execute("DROP INDEX IF EXISTS idx_transactions_user_date")
+    cursor.execute("DROP INDEX IF EXISTS idx_transactions_user_customer_date")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_day ON transactions(user_id, date_day)")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_customer_day
+        ON transactions(user_id, customer_id, date_day)
+    """)
+
+def _add_customer_balances(cursor):
+    # Running per-customer totals, maintained by database.add_transaction
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS customer_balances(
+        customer_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        total_credit REAL NOT NULL DEFAULT 0,
+        total_debit REAL NOT NULL DEFAULT 0,
+        last_txn_day INTEGER,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(customer_id) REFERENCES customers(id),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_balances_user ON customer_balances(user_id)")
+
+    # Backfill from existing history
+    cursor.execute("""
+    INSERT OR REPLACE INTO customer_balances(customer_id, user_id, total_credit, total_debit, last_txn_day, txn_count)
+    SELECT 
+        customer_id,
+        MIN(user_id),
+        SUM(CASE WHEN type = 'Credit' THEN amount ELSE 0 END),
+        SUM(CASE WHEN type = 'Debit' THEN amount ELSE 0 END),
+        MAX(date_day),
+        COUNT(*)
+    FROM transactions
+    GROUP BY customer_id
+    """)
+
+def _add_daily_summary(cursor):
+    # Per-shop daily totals, maintained by database.add_transaction and
+    # add_transactions_bulk; database.get_daily_totals rolls them up into weeks and months
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS daily_summary(
+        user_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        credit REAL NOT NULL DEFAULT 0,
+        debit REAL NOT NULL DEFAULT 0,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY(user_id, day)
+    ) WITHOUT ROWID
+    """)
+    
+    # Backfillfrom existing history
+    cursor.execute("""
+    INSERT OR REPLACE INTO daily_summary(user_id, day, credit, debit, txn_count)
+    SELECT 
+        user_id,
+        date_day,
+        SUM(CASE WHEN type = 'Credit' THEN amount ELSE 0 END),
+        SUM(CASE WHEN type = 'Debit' THEN amount ELSE 0 END),
+        COUNT(*)
+    FROM transactions
+    GROUP BY user_id, date_day
+    """)
+
+def _add_alerts(cursor):
+    # Open notifications, one row per low-stock item or overdue customer,
+    # maintained by database.py writes and refreshed once a day per shop
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alerts(
+        kind TEXT NOT NULL,
+        ref_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        since_day INTEGER NOT NULL,
+        PRIMARY KEY(kind, ref_id)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_user ON alerts(user_id, kind)")
+
+    # Per-shop thresholds; a shop without a row uses the defaults in database.py
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alert_settings(
+        user_id INTEGER PRIMARY KEY,
+        low_stock_threshold INTEGER,
+        overdue_days INTEGER,
+        last_rollover_day INTEGER,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+def _add_customer_search(cursor):
+    # Alphabetical browsing of a shop's customers (and the search fallback)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_user_name ON customers(user_id, name COLLATE NOCASE)")
+
+    # Full-text index on name and contact for database.search_customers.
+    # Contentless: it only maps tokens to customers.id. 'shop' holds 'u<user_id>'
+    # so a search only walks one shop's entries. Triggers keep it in sync.
+    try:
+        cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts
+            USING fts5(name, contact, shop, content='', prefix='1 2 3')
+        """)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        return  # SQLite built without FTS5; search_customers falls back to LIKE
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts(rowid, name, contact, shop)
+        VALUES (new.id, new.name, new.contact, 'u' || new.user_id);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, name, contact, shop)
+        VALUES ('delete', old.id, old.name, old.contact, 'u' || old.user_id);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS customers_fts_update AFTER UPDATE OF name, contact, user_id ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, name, contact, shop)
+        VALUES ('delete', old.id, old.name, old.contact, 'u' || old.user_id);
+        INSERT INTO customers_fts(rowid, name, contact, shop)
+        VALUES (new.id, new.name, new.contact, 'u' || new.user_id);
+    END
+    """)
+
+    # Backfill from existing customers
+    cursor.execute("""
+    INSERT INTO customers_fts(rowid, name, contact, shop)
+    SELECT id, name, contact, 'u' || user_id FROM customers
+    """)
+
+def _add_inventory_sku(cursor):
+    # Optional barcode/SKU; unique within a shop, looked up by database.get_item_by_code
+    cursor.execute("ALTER TABLE inventory ADD COLUMN sku TEXT")
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_user_sku
+        ON inventory(user_id, sku) WHERE sku IS NOT NULL
+    """)
+
+def _add_outbox(cursor):
+    # Queued emails, drained in the background by outbox.py
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS outbox(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        account TEXT NOT NULL,
+        to_email TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        html_body TEXT NOT NULL,
+        text_body TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+    # The sender only ever looks for due work; sent/failed rows stay out of the index
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON outbox(next_attempt_at) WHERE status IN ('pending', 'sending')
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_user ON outbox(user_id, status)")
+
+def _add_reminder_archive(cursor):
+    # Reminder history, newest first, for a shop or one of its customers
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payment_reminders_user_sent ON payment_reminders(user_id, sent_date)")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_payment_reminders_customer_sent
+        ON payment_reminders(user_id, customer_id, sent_date)
+    """)
+
+    # Rows past the retention window move here (auto_reminders.archive_reminders)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS payment_reminders_archive(
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        customer_id INTEGER NOT NULL,
+        reminder_day INTEGER NOT NULL,
+        sent_date TEXT NOT NULL,
+        pending_amount REAL NOT NULL,
+        days_overdue INTEGER NOT NULL,
+        status TEXT,
+        created_at TIMESTAMP
+    )
+    """)
+
+    # Per shop, month and threshold totals of archived reminders
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS reminder_monthly_summary(
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        reminder_day INTEGER NOT NULL,
+        sent_count INTEGER NOT NULL DEFAULT 0,
+        total_pending REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY(user_id, month, reminder_day)
+    ) WITHOUT ROWID
+    """)
+
+# (version, description, step) - append only, never renumber
+MIGRATIONS = [
+    (1, "Create base tables", _create_base_tables),
+    (2, "Add inventory.cost_price", _add_inventory_cost_price),
+    (3, "Add indexes for hot queries", _add_hot_query_indexes),
+    (4, "Add transactions.date_day", _add_transaction_date_day),
+    (5, "Add customer_balances", _add_customer_balances),
+    (6, "Add daily_summary rollups", _add_daily_summary),
+    (7, "Add alerts and alert_settings", _add_alerts),
+    (8, "Add customer search index", _add_customer_search),
+    (9, "Add inventory.sku", _add_inventory_sku),
+    (10, "Add email outbox", _add_outbox),
+    (11, "Add reminder archive and monthly summary", _add_reminder_archive),
+]
+
+# ─────────────────────────────────────────────
+# Runner
+# ─────────────────────────────────────────────
+def _ensure_version_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version(
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def get_schema_version(conn=None):
+    """Highest applied migration version (0 for a fresh database)"""
+    conn = conn or db.get_connection()
+    cursor = conn.cursor()
+    _ensure_version_table(cursor)
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    version = cursor.fetchone()[0]
+    return version or 0
+
+def migrate(conn=None):
+    """
+    Apply all pending migrations in order
+    Returns: list of applied versions
+    """
+    conn = conn or db.get_connection()
+    cursor = conn.cursor()
+    applied = []
+
+    # BEGIN IMMEDIATE so two processes starting together don't both migrate
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        current = get_schema_version(conn)
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(cursor)
+            cursor.execute("INSERT INTO schema_version(version, description) VALUES(?,?)",
+                           (version, description))
+            applied.append(version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return applied
+
+# ─────────────────────────────────────────────
+# Query plan checks
+# ─────────────────────────────────────────────
+
+# (module, function, sample args) for every public read path. Each one is
+# called for real, on a scratch copy of the database (some reads write, e.g.
+# the alert rollover), and the SQL it runs is checked with EXPLAIN QUERY PLAN.
+PLAN_CHECKS = [
+    ("database", "get_users", ("owner@example.com",)),
+    ("database", "check_contact_exists", ("9876543210",)),
+    ("database", "get_customers", (1,)),
+    ("database", "get_customer_by_id", (1,)),
+    ("database", "search_customers", (1,)),
+    ("database", "search_customers", (1, "ra")),
+    ("database", "get_inventory", (1,)),
+    ("database", "get_item_by_code", (1, "8901234567890")),
+    ("database", "get_total_inventory_value", (1,)),
+    ("database", "get_transactions", (1,)),
+    ("database", "get_transactions", (1, 1)),
+    ("database", "get_transactions_filtered", (1, date(2024, 1, 1), date(2024, 12, 31))),
+    ("database", "get_transactions_filtered", (1, date(2024, 1, 1), date(2024, 12, 31), 1)),
+    ("database", "get_transactions_page", (1, 1)),
+    ("database", "get_transactions_page", (1, 1, (19000, 500))),
+    ("database", "get_transactions_page", (1, 1, None, 50, 'Credit')),
+    ("database", "get_daily_totals", (1,)),
+    ("database", "get_daily_totals", (1, date(2024, 1, 1), date(2024, 12, 31))),
+    ("database", "get_daily_totals", (1, None, None, 'week')),
+    ("database", "get_daily_totals", (1, date(2024, 1, 1), date(2024, 12, 31), 'month')),
+    ("database", "get_period_totals", (1,)),
+    ("database", "get_period_totals", (1, date(2024, 1, 1), date(2024, 12, 31))),
+    ("database", "get_net_balance", (1,)),
+    ("database", "get_income_expense", (1,)),
+    ("database", "get_customer_profit_comparison", (1,)),
+    ("database", "get_customer_balances", (1,)),
+    ("database", "get_customer_balance", (1,)),
+    ("database", "get_overdue_customers", (1,)),
+    ("database", "get_overdue_customers", (1, 10)),
+    ("database", "get_suppliers", (1,)),
+    ("database", "get_alert_count", (1,)),
+    ("database", "get_low_stock_alerts", (1,)),
+    ("database", "get_overdue_alerts", (1,)),
+    ("auto_reminders", "check_reminder_sent", (1, 1, 30)),
+    ("auto_reminders", "get_customers_needing_reminders", (1,)),
+    ("auto_reminders", "get_reminder_history", (1,)),
+    ("auto_reminders", "get_reminder_history", (1, 1)),
+    ("auto_reminders", "get_reminder_stats", (1,)),
+    ("auto_reminders", "get_reminder_monthly_summary", (1,)),
+    ("outbox", "get_outbox_status", (1,)),
+]
+
+# (function, plan detail) for the SCAN steps that are expected; any other
+# SCAN, with or without an index, fails the check
+ALLOWED_SCANS = {
+    # FTS5 reads its schema and config row, then walks its own index for MATCH
+    ("search_customers", "SCAN sqlite_master"),
+    ("search_customers", "SCAN main.customers_fts_config"),
+    ("search_customers", "SCAN f VIRTUAL TABLE INDEX 0:M3"),
+    # The overdue customers of one shop, already filtered by the CTE
+    ("get_customers_needing_reminders", "SCAN candidates"),
+    # At most one row per reminder day from the two grouped halves of the UNION
+    ("get_reminder_stats", "SCAN (subquery-2)"),
+    ("get_reminder_monthly_summary", "SCAN (subquery-2)"),
+}
+
+def find_table_scans(module_name, func_name, args):
+    """
+    Call a read function and EXPLAIN every query it issues
+    Returns: list of (sql, plan_detail) for scans not in ALLOWED_SCANS
+    """
+    module = __import__(module_name)
+    conn = db.get_connection()
+    statements = []
+
+    db.clear_cache()  # a cached result would issue no SQL to check
+    conn.set_trace_callback(statements.append)
+    try:
+        getattr(module, func_name)(*args)
+    finally:
+        conn.set_trace_callback(None)
+
+    scans = []
+    for sql in statements:
+        if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            continue
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+            detail = row[3]
+            if detail.startswith("SCAN ") and (func_name, detail) not in ALLOWED_SCANS:
+                scans.append((" ".join(sql.split()), detail))
+    return scans
+
+def check_query_plans():
+    """Print the plan check for each hot query; returns True when none scan a table"""
+    ok = True
+    with db.scratch_copy():
+        for module_name, func_name, args in PLAN_CHECKS:
+            scans = find_table_scans(module_name, func_name, args)
+            label = f"{module_name}.{func_name}{args}"
+            if scans:
+                ok = False
+                print(f"  FAIL  {label}")
+                for sql, detail in scans:
+                    print(f"          {detail}  <-  {sql}")
+            else:
+                print(f"  ok    {label}")
+    return ok
+
+def show_status():
+    current = get_schema_version()
+    print(f"Database: {db.DATABASE_NAME}")
+    print(f"Schema version: {current}")
+    for version, description, _ in MIGRATIONS:
+        state = "applied" if version <= current else "pending"
+        print(f"  {version:>3}  {state:<8} {description}")
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+
+    if command == "upgrade":
+        applied = migrate()
+        if applied:
+            print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+        else:
+            print("Database is up to date.")
+    elif command == "status":
+        show_status()
+    elif command == "rebuild-balances":
+        migrate()
+        db.rebuild_customer_balances()
+        print("Customer balances rebuilt from transactions.")
+    elif command == "verify-balances":
+        migrate()
+        mismatched = db.verify_customer_balances()
+        if mismatched:
+            print(f"Balances out of date for customer ids: {', '.join(str(c) for c in mismatched)}")
+            print("Run 'python migrations.py rebuild-balances' to fix them.")
+            sys.exit(1)
+        print("Customer balances match transactions.")
+    elif command == "rebuild-rollups":
+        migrate()
+        db.rebuild_daily_summary()
+        print("Daily summary rebuilt from transactions.")
+    elif command == "verify-rollups":
+        migrate()
+        mismatched = db.verify_daily_summary()
+        if mismatched:
+            print(f"Daily summary out of date for {len(mismatched)} shop-days, e.g. user {mismatched[0][0]} "
+                  f"on {db.from_day(mismatched[0][1])}")
+            print("Run 'python migrations.py rebuild-rollups' to fix them.")
+            sys.exit(1)
+        print("Daily summary matches transactions.")
+    elif command == "rebuild-alerts":
+        migrate()
+        db.rebuild_alerts()
+        print("Alerts rebuilt from inventory and customer balances.")
+    elif command == "check-plans":
+        migrate()
+        if not check_query_plans():
+            sys.exit(1)
+    else:
+        print(__doc__)
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
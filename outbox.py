@@ -0,0 +1,309 @@
+"""
+Email Outbox
+Emails are queued in the outbox table (see migrations.py) and delivered by a
+background thread, so nothing waits on SMTP inside a Streamlit click.
+
+The sender drains due rows in batches, one authenticated connection per
+account per batch, retries failures with exponential backoff, keeps each
+account under RATE_LIMIT_PER_MINUTE and writes the delivery status back.
+
+Credentials are never stored in the database: register_account() keeps them
+in memory for this process, per shop and sender address. Rows for a shop
+whose credentials are missing, or whose login was refused, stay pending
+without using up attempts until register_account() is called again.
+"""
+
+import sys
+import time
+import smtplib
+import threading
+from collections import deque
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import database as db
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30     # doubled after every failed attempt
+RATE_LIMIT_PER_MINUTE = 60     # per SMTP account; 0 = unlimited
+LEASE_SECONDS = 300            # a 'sending' row older than this is picked up again
+POLL_SECONDS = 5
+SMTP_TIMEOUT_SECONDS = 30
+
+# ─────────────────────────────────────────────
+# Accounts
+# ─────────────────────────────────────────────
+# Keyed by (user_id, smtp_email): shops can share a sender address with different passwords
+_accounts = {}
+_login_errors = {}  # (user_id, smtp_email) -> why the account is paused
+_accounts_lock = threading.Lock()
+
+def register_account(user_id, email_config):
+    """Remember a shop's SMTP settings (smtp_server, smtp_port, smtp_email, smtp_password) for the sender"""
+    with _accounts_lock:
+        key = (user_id, email_config['smtp_email'])
+        _accounts[key] = dict(email_config)
+        _login_errors.pop(key, None)
+    _wakeup.set()
+
+def _get_account(key):
+    with _accounts_lock:
+        return _accounts.get(key)
+
+def _pause_account(key, error):
+    # A refused login fails every message alike: stop using these credentials until they are saved again
+    with _accounts_lock:
+        _accounts.pop(key, None)
+        _login_errors[key] = str(error)
+
+def get_login_error(user_id, smtp_email):
+    """Why the sender paused this shop's account (login refused), or None"""
+    with _accounts_lock:
+        return _login_errors.get((user_id, smtp_email))
+
+def default_smtp_factory(config):
+    """Open, secure and log in to the account's SMTP server"""
+    server = smtplib.SMTP(config.get('smtp_server', 'smtp.gmail.com'), config.get('smtp_port', 587),
+                          timeout=SMTP_TIMEOUT_SECONDS)
+    server.starttls()
+    server.login(config['smtp_email'], config['smtp_password'])
+    return server
+
+def check_login(email_config, smtp_factory=None):
+    """
+    Connect and log in once with these settings, for feedback when they are saved
+    Returns: (success: bool, message: str)
+    """
+    smtp_factory = smtp_factory or default_smtp_factory
+    try:
+        server = smtp_factory(email_config)
+    except smtplib.SMTPAuthenticationError as e:
+        return False, f"Login refused by the mail server ({e.smtp_code}), check the App Password"
+    except (smtplib.SMTPException, OSError) as e:
+        return False, f"Could not connect to the mail server: {e}"
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        pass
+    return True, "Login successful"
+
+# ─────────────────────────────────────────────
+# Queue
+# ─────────────────────────────────────────────
+def enqueue_email(user_id, account, to_email, subject, html_body, text_body):
+    """
+    Queue one email for the background sender
+    Returns: outbox id
+    """
+    def write(cursor):
+        cursor.execute("""
+            INSERT INTO outbox(user_id, account, to_email, subject, html_body, text_body, next_attempt_at)
+            VALUES(?,?,?,?,?,?,?)
+        """, (user_id, account, to_email, subject, html_body, text_body, time.time()))
+        return cursor.lastrowid
+
+    outbox_id = db.run_write(write)
+    _wakeup.set()
+    return outbox_id
+
+def get_outbox_status(user_id):
+    """Number of a shop's queued emails by status"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT status, COUNT(*) FROM outbox WHERE user_id=? GROUP BY status", (user_id,))
+    counts = {'pending': 0, 'sending': 0, 'sent': 0, 'failed': 0}
+    counts.update({row[0]: row[1] for row in cursor.fetchall()})
+    return counts
+
+def _claim_batch(now):
+    # Lease the next due rows; a sender that dies mid-batch releases them when the lease expires
+    def write(cursor):
+        cursor.execute("""
+            UPDATE outbox SET status = 'sending', next_attempt_at = ?
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING id, user_id, account, to_email, subject, html_body, text_body, attempts
+        """, (now + LEASE_SECONDS, now, BATCH_SIZE))
+        return [dict(row) for row in cursor.fetchall()]
+
+    return db.run_write(write)
+
+def _record_results(sent, retries, failures, deferred):
+    def write(cursor):
+        cursor.executemany("""
+            UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL,
+                sent_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, [(outbox_id,) for outbox_id in sent])
+        cursor.executemany("""
+            UPDATE outbox SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+        """, retries)
+        cursor.executemany("""
+            UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ?
+            WHERE id = ?
+        """, failures)
+        cursor.executemany("UPDATE outbox SET status = 'pending', next_attempt_at = ? WHERE id = ?", deferred)
+
+    db.run_write(write)
+
+# ─────────────────────────────────────────────
+# Sender
+# ─────────────────────────────────────────────
+_sent_times = {}  # sender address -> send times within the last minute (the provider's limit is per mailbox)
+
+def _next_send_slot(account, now):
+    """None if the account may send now, else the time its rate limit frees up"""
+    if not RATE_LIMIT_PER_MINUTE:
+        return None
+    window = _sent_times.setdefault(account, deque())
+    while window and window[0] <= now - 60:
+        window.popleft()
+    if len(window) < RATE_LIMIT_PER_MINUTE:
+        return None
+    return window[0] + 60
+
+def _build_message(row):
+    message = MIMEMultipart("alternative")
+    message["Subject"] = row['subject']
+    message["From"] = row['account']
+    message["To"] = row['to_email']
+    message.attach(MIMEText(row['text_body'], "plain"))
+    message.attach(MIMEText(row['html_body'], "html"))
+    return message
+
+def _is_permanent(error):
+    # 5xx replies and refused recipients will not succeed on a retry
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+def _send_account_batch(key, rows, smtp_factory, now, results):
+    sent, retries, failures, deferred = results
+    account = key[1]
+    
+    def retry_or_fail(row, error, permanent=False):
+        if row['attempts'] + 1 >= MAX_ATTEMPTS or permanent:
+            failures.append((str(error), row['id']))
+        else:
+            retries.append((now + RETRY_BACKOFF_SECONDS * (2 ** row['attempts']), str(error), row['id']))
+    
+    config = _get_account(key)
+    if config is None:
+        # No credentials (yet, or the login was refused): wait without using up attempts
+        deferred.extend((now + RETRY_BACKOFF_SECONDS, row['id']) for row in rows)
+        return
+    
+    server = None
+    try:
+        for index, row in enumerate(rows):
+            slot = _next_send_slot(account, time.time())
+            if slot is not None:
+                deferred.extend((slot, later['id']) for later in rows[index:])
+                break
+            if server is None:
+                try:
+                    server = smtp_factory(config)
+                except smtplib.SMTPAuthenticationError as e:
+                    _pause_account(key, e)
+                    deferred.extend((now + RETRY_BACKOFF_SECONDS, later['id']) for later in rows[index:])
+                    break
+                except Exception as e:
+                    # Could not connect: not the messages' fault, so even a 5xx is retried
+                    for later in rows[index:]:
+                        retry_or_fail(later, e)
+                    break
+            try:
+                server.send_message(_build_message(row))
+                if RATE_LIMIT_PER_MINUTE:
+                    _sent_times[account].append(time.time())
+                sent.append(row['id'])
+            except smtplib.SMTPServerDisconnected as e:
+                server = None  # reconnect for the next message
+                retry_or_fail(row, e)
+            except Exception as e:
+                # Anything else (a bad header, an encoding error) counts against this row only
+                retry_or_fail(row, e, _is_permanent(e))
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+def drain_outbox(smtp_factory=None):
+    """
+    Send every due email, batch by batch, until nothing more can go out now
+    Returns: {'sent': n, 'retried': n, 'failed': n, 'deferred': n}
+    """
+    smtp_factory = smtp_factory or default_smtp_factory
+    totals = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+    while True:
+        now = time.time()
+        rows = _claim_batch(now)
+        if not rows:
+            break
+
+        by_account = {}
+        for row in rows:
+            by_account.setdefault((row['user_id'], row['account']), []).append(row)
+        
+        results = ([], [], [], [])
+        try:
+            for key, account_rows in by_account.items():
+                _send_account_batch(key, account_rows, smtp_factory, now, results)
+        finally:
+            # Rows already sent must be marked even if a later account blew up
+            _record_results(*results)
+
+        sent, retries, failures, deferred = results
+        totals['sent'] += len(sent)
+        totals['retried'] += len(retries)
+        totals['failed'] += len(failures)
+        totals['deferred'] += len(deferred)
+        if not sent:
+            break  # everything left is waiting on a retry or a rate limit
+    return totals
+
+# ─────────────────────────────────────────────
+# Background thread
+# ─────────────────────────────────────────────
+_wakeup = threading.Event()
+_stop = threading.Event()
+_sender_thread = None
+_sender_lock = threading.Lock()
+
+def _sender_loop(smtp_factory):
+    while not _stop.is_set():
+        try:
+            drain_outbox(smtp_factory)
+        except Exception as e:
+            print(f"Outbox sender error: {e}", file=sys.stderr)
+        _wakeup.wait(POLL_SECONDS)
+        _wakeup.clear()
+
+def start_sender(smtp_factory=None):
+    """Start this process's background sender (once; later calls are no-ops)"""
+    global _sender_thread
+    with _sender_lock:
+        if _sender_thread is not None and _sender_thread.is_alive():
+            return
+        _stop.clear()
+        _sender_thread = threading.Thread(target=_sender_loop, args=(smtp_factory,),
+                                          name="outbox-sender", daemon=True)
+        _sender_thread.start()
+
+def stop_sender(timeout=None):
+    """Ask the background sender to finish its current batch and exit"""
+    global _sender_thread
+    with _sender_lock:
+        thread = _sender_thread
+        _sender_thread = None
+    _stop.set()
+    _wakeup.set()
+    if thread is not None:
+        thread.join(timeout)
@@ -3,7 +3,8 @@ import pandas as pd
 from datetime import datetime, timedelta
 import database as db
 import io
-from email_helper import send_low_stock_notification, send_overdue_payment_notification
+
+SETTINGS_TABS = ["🏪 Shop Settings", "📧 Email Settings", "📥 Export Data", "🔔 Notifications"]
 
 def settings_page(default_tab=0):
     """Settings page with shop info, data export, and notifications"""
@@ -20,33 +21,36 @@ def settings_page(default_tab=0):
     
     st.title("⚙️ Settings & Notifications")
     
-    # Create tabs for different settings
-    tabs = st.tabs(["🏪 Shop Settings", "📧 Email Settings", "📥 Export Data", "🔔 Notifications"])
-    
-    # Get notification count for badge
-    low_stock_items = get_low_stock_items(user_id)
-    overdue_customers = get_overdue_customers(user_id)
-    total_notifications = len(low_stock_items) + len(overdue_customers)
+    # Only the selected section is rendered, so only its data is queried
+    # (st.tabs would run every tab's code on every rerun)
+    tab = st.radio(
+        "Settings section",
+        SETTINGS_TABS,
+        index=default_tab,
+        horizontal=True,
+        label_visibility="collapsed"
+    )
     
     # Show notification badge at top if there are notifications
+    total_notifications = db.get_alert_count(user_id)
     if total_notifications > 0:
         st.error(f"⚠️ {total_notifications} notifications require your attention!")
     
+    # Initialize shop settings in session state if not exists
+    if 'shop_settings' not in st.session_state:
+        st.session_state.shop_settings = {
+            'shop_address': '',
+            'shop_phone': '',
+            'currency': '₹ INR',
+            'tax_rate': 0.0,
+            'low_stock_alert': db.get_alert_settings(user_id)['low_stock_threshold']
+        }
+    
     # ============ TAB 1: SHOP SETTINGS ============
-    with tabs[0]:
+    if tab == SETTINGS_TABS[0]:
         st.subheader("Shop Information")
         st.write("")
         
-        # Initialize shop settings in session state if not exists
-        if 'shop_settings' not in st.session_state:
-            st.session_state.shop_settings = {
-                'shop_address': '',
-                'shop_phone': '',
-                'currency': '₹ INR',
-                'tax_rate': 0.0,
-                'low_stock_alert': 10
-            }
-        
         # Initialize email settings if not exists
         if 'email_settings' not in st.session_state:
             st.session_state.email_settings = {
@@ -113,6 +117,7 @@ def settings_page(default_tab=0):
                     'tax_rate': tax_rate,
                     'low_stock_alert': low_stock_alert
                 }
+                db.set_low_stock_threshold(user_id, low_stock_alert)
                 st.success("✅ Settings saved successfully!")
         
         st.divider()
@@ -159,7 +164,7 @@ def settings_page(default_tab=0):
         st.session_state.email_settings['smtp_server'] = 'smtp.gmail.com'
         st.session_state.email_settings['smtp_port']   = 587
 
-    with tabs[1]:
+    if tab == SETTINGS_TABS[1]:
         st.subheader("📧 Email Notification Settings")
         st.write("")
 
@@ -213,6 +218,16 @@ def settings_page(default_tab=0):
                 st.success("✅ Settings saved!")
                 if enable_email and not smtp_password:
                     st.warning("⚠️ Don't forget to enter your App Password!")
+                elif enable_email:
+                    # Log in once now, so a wrong password shows here rather than as stuck emails
+                    from outbox import check_login, register_account
+                    with st.spinner("Checking login..."):
+                        login_ok, login_message = check_login(st.session_state.email_settings)
+                    if login_ok:
+                        register_account(user_id, st.session_state.email_settings)
+                        st.success(f"✅ {login_message}")
+                    else:
+                        st.error(f"❌ {login_message}")
 
             if test_btn:
                 if not enable_email:
@@ -224,25 +239,15 @@ def settings_page(default_tab=0):
                         'enabled': enable_email,
                         'smtp_password': smtp_password
                     })
-                    from email_helper import send_notification_email
-                    test_body = f"""
-                    <h2 style='color:#0284C7;'>Test Email Successful! ✅</h2>
-                    <p>Your Vyapar DigiKhata email notifications are working correctly.</p>
-                    <ul>
-                        <li>📦 <b>Low Stock Alerts</b></li>
-                        <li>💰 <b>Overdue Payment Alerts</b></li>
-                    </ul>
-                    <p><b>Shop Owner:</b> {username}</p>
-                    <p><b>Account:</b> {st.session_state.user['email']}</p>
-                    """
-                    with st.spinner("Sending..."):
+                    from email_helper import send_notification_email, generate_test_email
+                    with st.spinner("Queuing..."):
                         success, message = send_notification_email(
                             st.session_state.user['email'],
                             "🔔 Test Email from Vyapar DigiKhata",
-                            test_body
+                            generate_test_email(username, st.session_state.user['email'])
                         )
                     if success:
-                        st.success("✅ Test email sent! Check your inbox.")
+                        st.success("✅ Test email queued! It will arrive in your inbox shortly.")
                     else:
                         st.error(f"❌ {message}")
 
@@ -250,50 +255,34 @@ def settings_page(default_tab=0):
         status = "✅ Enabled" if st.session_state.email_settings.get('enabled', False) else "❌ Disabled"
         has_pass = "✅ Set" if st.session_state.email_settings.get('smtp_password') else "❌ Not set"
         st.markdown(f"**Status:** {status} &nbsp;&nbsp; **Password:** {has_pass}")
+        
+        from outbox import get_outbox_status, get_login_error
+        outbox_status = get_outbox_status(user_id)
+        queued = outbox_status['pending'] + outbox_status['sending']
+        st.caption(f"📤 Outbox: {queued} queued, {outbox_status['sent']} sent, {outbox_status['failed']} failed")
+        login_error = get_login_error(user_id, FIXED_SMTP_EMAIL)
+        if login_error:
+            st.warning(f"⚠️ Sending is paused, the mail server refused the login ({login_error}). "
+                       "Save a new App Password to resume.")
     
     # ============ TAB 3: EXPORT DATA ============
-    with tabs[2]:
+    if tab == SETTINGS_TABS[2]:
         st.subheader("📥 Download Your Data")
         st.write("Export your business data as CSV files for backup or analysis")
         st.write("")
         
+        # Files are only built when asked for, not on every rerun
         col1, col2 = st.columns(2)
         
         # Export Customers
         with col1:
             st.markdown("#### 👥 Customer Data")
-            customers = db.get_customers(user_id)
-            if customers:
-                df_customers = pd.DataFrame(customers)
-                csv_customers = df_customers.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📄 Download Customers CSV",
-                    data=csv_customers,
-                    file_name=f"customers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-                st.info(f"Total Customers: {len(customers)}")
-            else:
-                st.warning("No customer data available")
+            export_csv(db.get_customers_frame, user_id, "Customers", "customers", "Total Customers", "customer")
         
         # Export Customer Transactions
         with col2:
             st.markdown("#### 💳 Customer Transactions")
-            transactions = db.get_transactions(user_id)
-            if transactions:
-                df_transactions = pd.DataFrame(transactions)
-                csv_transactions = df_transactions.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📄 Download Transactions CSV",
-                    data=csv_transactions,
-                    file_name=f"transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-                st.info(f"Total Transactions: {len(transactions)}")
-            else:
-                st.warning("No transaction data available")
+            export_csv(db.get_transactions_frame, user_id, "Transactions", "transactions", "Total Transactions", "transaction")
         
         st.write("")
         
@@ -302,38 +291,12 @@ def settings_page(default_tab=0):
         # Export Inventory
         with col3:
             st.markdown("#### 📦 Inventory Data")
-            inventory = db.get_inventory(user_id)
-            if inventory:
-                df_inventory = pd.DataFrame(inventory)
-                csv_inventory = df_inventory.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📄 Download Inventory CSV",
-                    data=csv_inventory,
-                    file_name=f"inventory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-                st.info(f"Total Items: {len(inventory)}")
-            else:
-                st.warning("No inventory data available")
+            export_csv(db.get_inventory_frame, user_id, "Inventory", "inventory", "Total Items", "inventory")
         
         # Export Suppliers
         with col4:
             st.markdown("#### 🏭 Supplier Data")
-            suppliers = db.get_suppliers(user_id)
-            if suppliers:
-                df_suppliers = pd.DataFrame(suppliers)
-                csv_suppliers = df_suppliers.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📄 Download Suppliers CSV",
-                    data=csv_suppliers,
-                    file_name=f"suppliers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-                st.info(f"Total Suppliers: {len(suppliers)}")
-            else:
-                st.warning("No supplier data available")
+            export_csv(db.get_suppliers_frame, user_id, "Suppliers", "suppliers", "Total Suppliers", "supplier")
         
         st.divider()
         
@@ -390,10 +353,13 @@ def settings_page(default_tab=0):
             st.success("✅ Report generated successfully!")
     
     # ============ TAB 4: NOTIFICATIONS ============
-    with tabs[3]:
+    if tab == SETTINGS_TABS[3]:
         st.subheader("🔔 Notifications & Alerts")
         st.write("")
         
+        low_stock_items = get_low_stock_items(user_id)
+        overdue_customers = get_overdue_customers(user_id)
+        
         # Display notification summary with color indicator
         if total_notifications > 0:
             st.error(f"⚠️ You have **{total_notifications}** notifications requiring attention!")
@@ -453,11 +419,12 @@ def settings_page(default_tab=0):
                     user_email = st.session_state.user['email']
                     shop_name = st.session_state.shop_settings.get('shop_name', 'Your Shop')
                     
-                    with st.spinner("Sending email..."):
+                    from email_helper import send_low_stock_notification
+                    with st.spinner("Queuing email..."):
                         success, message = send_low_stock_notification(user_email, low_stock_items, shop_name)
                     
                     if success:
-                        st.success("✅ Low stock alert email sent successfully!")
+                        st.success("✅ Low stock alert email queued for delivery!")
                     else:
                         st.error(f"❌ Failed to send email: {message}")
             else:
@@ -502,11 +469,12 @@ def settings_page(default_tab=0):
                     user_email = st.session_state.user['email']
                     shop_name = st.session_state.shop_settings.get('shop_name', 'Your Shop')
                     
-                    with st.spinner("Sending email..."):
+                    from email_helper import send_overdue_payment_notification
+                    with st.spinner("Queuing email..."):
                         success, message = send_overdue_payment_notification(user_email, overdue_customers, shop_name)
                     
                     if success:
-                        st.success("✅ Overdue payment alert email sent successfully!")
+                        st.success("✅ Overdue payment alert email queued for delivery!")
                     else:
                         st.error(f"❌ Failed to send email: {message}")
             else:
@@ -514,63 +482,26 @@ def settings_page(default_tab=0):
         else:
             st.success("✅ No overdue customer payments!")
 
+def export_csv(load_frame, user_id, label, file_prefix, count_label, data_name):
+    """Prepare button for one CSV export; the query and CSV only run once it is clicked"""
+    if st.button(f"⚙️ Prepare {label} CSV", key=f"prepare_{file_prefix}", use_container_width=True):
+        df = load_frame(user_id)
+        if not df.empty:
+            st.download_button(
+                label=f"📄 Download {label} CSV",
+                data=df.to_csv(index=False).encode('utf-8'),
+                file_name=f"{file_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+            st.info(f"{count_label}: {len(df)}")
+        else:
+            st.warning(f"No {data_name} data available")
+
 def get_low_stock_items(user_id):
     """Get items with low stock"""
-    inventory = db.get_inventory(user_id)
-    
-    # Get threshold from settings
-    threshold = 10
-    if 'shop_settings' in st.session_state:
-        threshold = st.session_state.shop_settings.get('low_stock_alert', 10)
-    
-    low_stock = [item for item in inventory if item['quantity'] < threshold]
-    return low_stock
+    return db.get_low_stock_alerts(user_id)
 
 def get_overdue_customers(user_id):
-    """Get customers with overdue payments (Debit transactions older than 30 days)"""
-    customers = db.get_customers(user_id)
-    transactions = db.get_transactions(user_id)
-    
-    overdue_list = []
-    current_date = datetime.now()
-    
-    for customer in customers:
-        customer_id = customer['id']
-        customer_name = customer['name']
-        customer_phone = customer.get('contact', '')
-        
-        # Get all transactions for this customer
-        customer_transactions = [t for t in transactions if t['customer_id'] == customer_id]
-        
-        if not customer_transactions:
-            continue
-        
-        # Calculate pending amount (Credit - Debit)
-        total_credit = sum(t['amount'] for t in customer_transactions if t['type'] == 'Credit')
-        total_debit = sum(t['amount'] for t in customer_transactions if t['type'] == 'Debit')
-        pending_amount = total_credit - total_debit
-        
-        # Only check if there's pending amount
-        if pending_amount > 0:
-            # Get last transaction date
-            last_transaction = max(customer_transactions, key=lambda x: x['date'])
-            last_date = datetime.strptime(last_transaction['date'], '%Y-%m-%d')
-            
-            # Calculate days overdue
-            days_diff = (current_date - last_date).days
-            
-            # If more than 30 days and pending amount exists
-            if days_diff > 30:
-                overdue_list.append({
-                    'customer_id': customer_id,
-                    'customer_name': customer_name,
-                    'customer_phone': customer_phone,
-                    'pending_amount': pending_amount,
-                    'days_overdue': days_diff,
-                    'last_transaction_date': last_transaction['date']
-                })
-    
-    # Sort by days overdue (descending)
-    overdue_list.sort(key=lambda x: x['days_overdue'], reverse=True)
-    
-    return overdue_list
\ No newline at end of file
+    """Get customers with overdue payments (pending balance, no transaction for over 30 days)"""
+    return db.get_overdue_alerts(user_id)